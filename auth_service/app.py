@@ -8,13 +8,15 @@ import secrets
 import sys
 from pathlib import Path
 
-from shared.cosmosdb import CosmosDB
+from shared.cosmosdb import CosmosDB, run_background, run_sync
 
 app = Flask(__name__)
 CORS(app)
 
-# Initialize Cosmos DB
-db = CosmosDB()
+# Initialize Cosmos DB; its async client runs on a shared background loop
+db = run_sync(CosmosDB().initialize())
+# Settle sagas left pending by a crash or a failed rollback, now and periodically
+saga_reconciler = run_background(db.reconcile_sagas_periodically())
 
 # Configuration
 app.config['JWT_SECRET_KEY'] = os.environ.get('JWT_SECRET_KEY', 'dev_secret_key')
@@ -59,11 +61,6 @@ def register_host():
     email = data['email']
     password = data['password']
 
-    # Check if host exists
-    existing_host = db.get_host_by_email(email)
-    if existing_host:
-        return jsonify({'error': 'Email already registered'}), 409
-
     # Hash password
     salt = bcrypt.gensalt()
     hashed_password = bcrypt.hashpw(password.encode('utf-8'), salt)
@@ -78,7 +75,10 @@ def register_host():
         'created_at': datetime.now(UTC).isoformat()
     }
 
-    db.create_host(host_data)
+    # The container's unique key on /email rejects duplicates atomically
+    _, created = run_sync(db.try_create_host(host_data))
+    if not created:
+        return jsonify({'error': 'Email already registered'}), 409
 
     return jsonify({
         'message': 'Host registered successfully',
@@ -97,7 +97,7 @@ def host_login():
     password = data['password']
 
     # Get host from Cosmos DB
-    host_doc = db.get_host_by_email(email)
+    host_doc = run_sync(db.get_host_by_email(email))
     if not host_doc:
         return jsonify({'error': 'Invalid credentials'}), 401
 
@@ -1,18 +1,23 @@
 import pytest
-from unittest.mock import MagicMock
+from unittest.mock import AsyncMock, MagicMock
 from shared.cosmosdb import CosmosDB
 
 class MockCosmosDB:
     def __init__(self):
         self.hosts = {}  # In-memory storage for testing
 
-    def get_host_by_email(self, email):
+    async def get_host_by_email(self, email):
         return self.hosts.get(email)
 
-    def create_host(self, host_data):
+    async def create_host(self, host_data):
         self.hosts[host_data['email']] = host_data
         return host_data
 
+    async def try_create_host(self, host_data):
+        if host_data['email'] in self.hosts:
+            return host_data, False
+        return await self.create_host(host_data), True
+
 @pytest.fixture(autouse=True)
 def mock_cosmosdb(monkeypatch):
     """Replace CosmosDB with mock for all tests."""
@@ -21,10 +26,11 @@ def mock_cosmosdb(monkeypatch):
     def mock_init(self):
         self.client = MagicMock()
         self.database = MagicMock()
-        self.container = MagicMock()
+        self.container = AsyncMock()
 
     monkeypatch.setattr(CosmosDB, '__init__', mock_init)
     monkeypatch.setattr(CosmosDB, 'get_host_by_email', mock_db.get_host_by_email)
     monkeypatch.setattr(CosmosDB, 'create_host', mock_db.create_host)
+    monkeypatch.setattr(CosmosDB, 'try_create_host', mock_db.try_create_host)
 
     return mock_db
@@ -2,7 +2,7 @@ import pytest
 import jwt
 from datetime import datetime, timedelta, UTC
 from app import app
-from shared.cosmosdb import CosmosDB
+from shared.cosmosdb import CosmosDB, run_sync
 
 @pytest.fixture
 def client():
@@ -126,12 +126,12 @@ def cleanup():
             'login@example.com'
         ]
         for email in test_emails:
-            host = db.get_host_by_email(email)
+            host = run_sync(db.get_host_by_email(email))
             if host:
-                db.container.delete_item(
+                run_sync(db.container.delete_item(
                     item=host['id'],
                     partition_key='host'
-                )
+                ))
     except Exception as e:
         print(f"Error during cleanup: {str(e)}")
 
@@ -140,11 +140,11 @@ def cleanup():
     # Clean up after test
     try:
         for email in test_emails:
-            host = db.get_host_by_email(email)
+            host = run_sync(db.get_host_by_email(email))
             if host:
-                db.container.delete_item(
+                run_sync(db.container.delete_item(
                     item=host['id'],
                     partition_key='host'
-                )
+                ))
     except Exception as e:
         print(f"Error during cleanup: {str(e)}")
@@ -5,8 +5,9 @@ import os
 import random
 import string
 import requests
+from requests.adapters import HTTPAdapter
 from datetime import datetime, timezone
-from gevent import spawn_later, sleep
+from gevent import spawn, spawn_later, sleep
 
 app = Flask(__name__)
 CORS(app)
@@ -26,6 +27,12 @@ STREAK_BONUS = 100        # points per answer streak
 
 # Configuration
 AUTH_SERVICE_URL = os.environ.get('AUTH_SERVICE_URL', 'http://localhost:5001')
+QUESTION_SERVICE_URL = os.environ.get('QUESTION_SERVICE_URL', 'http://localhost:5003')
+
+# Shared outbound HTTP session so calls to sibling services reuse connections
+SESSION = requests.Session()
+SESSION.mount('http://', HTTPAdapter(pool_connections=2, pool_maxsize=32))
+SESSION.mount('https://', HTTPAdapter(pool_connections=2, pool_maxsize=32))
 
 def generate_game_pin():
     """Generate a unique 6-digit game PIN."""
@@ -37,7 +44,7 @@ def generate_game_pin():
 def verify_host_token(token):
     """Verify host token with auth service."""
     try:
-        response = requests.post(
+        response = SESSION.post(
             f"{AUTH_SERVICE_URL}/host/verify",
             headers={'Authorization': f'Bearer {token}'}
         )
@@ -50,6 +57,17 @@ def verify_host_token(token):
     except requests.RequestException:
         return False, "Authentication service unavailable"
 
+def warm_game_questions(pin, token):
+    """Ask the question service to prefetch questions for a new game."""
+    try:
+        SESSION.post(
+            f"{QUESTION_SERVICE_URL}/questions/game/{pin}/warm",
+            headers={'Authorization': f'Bearer {token}'},
+            timeout=2
+        )
+    except requests.RequestException as e:
+        app.logger.warning(f"Question warm-up request failed for game {pin}: {str(e)}")
+
 @app.route('/health', methods=['GET'])
 def health_check():
     """Health check endpoint."""
@@ -95,6 +113,9 @@ def create_game():
         'answers': {}
     }
 
+    # Prefetch questions off the request path so the first fetch is a cache hit
+    spawn(warm_game_questions, game_pin, token)
+
     return jsonify({
         'pin': game_pin,
         'status': 'created'
@@ -243,6 +264,9 @@ def handle_join_game(data):
         'player_count': len(game['players'])
     }, room=pin)
 
+    # Acknowledge the joining client directly
+    return {'ok': True, 'player_id': player_id}
+
 @socketio.on('disconnect')
 def handle_disconnect():
     """Handle player disconnection."""
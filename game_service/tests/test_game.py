@@ -1,13 +1,17 @@
 """Test game service core functionality."""
 import pytest
 import asyncio
+import requests
 from unittest.mock import patch, AsyncMock
 import sys
 import os
 from datetime import datetime, timezone
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from app import app, socketio, games, active_players, handle_question_end
+from app import (
+    app, socketio, games, active_players, handle_question_end,
+    warm_game_questions, QUESTION_SERVICE_URL
+)
 
 # Constants for test configuration
 TEST_TIMEOUT = 5  # seconds
@@ -34,7 +38,9 @@ async def socket_client():
     """Create an async socket client for testing."""
     app.config["TESTING"] = True
     client = socketio.AsyncClient()
-    await client.connect(f'http://{app.config["HOST"]}:{app.config["PORT"]}')
+    await client.connect(
+        f'http://{app.config["HOST"]}:{app.config["PORT"]}', transports=['websocket']
+    )
     yield client
     if client.connected:
         await client.disconnect()
@@ -91,6 +97,36 @@ async def test_create_game_invalid_token():
         pytest.fail(f"Test failed: {str(e)}")
 
 
+def test_create_game_warms_questions(mock_valid_token):
+    """Test that game creation asks the question service to warm up with the host token."""
+    with patch("app.spawn") as mock_spawn, patch("app.SESSION.post") as mock_post:
+        response = app.test_client().post(
+            "/game/create", headers={"Authorization": "Bearer valid_token"}
+        )
+        assert response.status_code == 200
+        pin = response.json["pin"]
+        mock_spawn.assert_called_once_with(warm_game_questions, pin, "valid_token")
+
+        # Run the spawned warm-up and check the request it sends
+        warm_game_questions(pin, "valid_token")
+        url = mock_post.call_args.args[0]
+        assert url == f"{QUESTION_SERVICE_URL}/questions/game/{pin}/warm"
+        assert mock_post.call_args.kwargs["headers"] == {"Authorization": "Bearer valid_token"}
+
+
+def test_create_game_survives_failed_warm_up(mock_valid_token):
+    """Test that a failing warm-up request never fails game creation."""
+    # Run the warm-up inline so its failure happens inside the request
+    with patch("app.spawn", side_effect=lambda func, *args: func(*args)), \
+            patch("app.SESSION.post", side_effect=requests.ConnectionError("refused")) as mock_post:
+        response = app.test_client().post(
+            "/game/create", headers={"Authorization": "Bearer valid_token"}
+        )
+        assert response.status_code == 200
+        assert response.json["pin"] in games
+        mock_post.assert_called_once()
+
+
 @pytest.mark.asyncio
 async def test_game_status(mock_valid_token):
     """Test getting game status."""
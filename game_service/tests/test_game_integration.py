@@ -35,7 +35,9 @@ async def socket_client():
     """Create an async socket client for testing."""
     app.config["TESTING"] = True
     client = socketio.AsyncClient()
-    await client.connect(f'http://{app.config["HOST"]}:{app.config["PORT"]}')
+    await client.connect(
+        f'http://{app.config["HOST"]}:{app.config["PORT"]}', transports=['websocket']
+    )
     yield client
     if client.connected:
         await client.disconnect()
@@ -60,7 +62,10 @@ async def test_full_game_round():
         socket_clients = []
         for i in range(3):
             client = socketio.AsyncClient()
-            await client.connect(f'http://{app.config["HOST"]}:{app.config["PORT"]}')
+            await client.connect(
+                f'http://{app.config["HOST"]}:{app.config["PORT"]}',
+                transports=['websocket']
+            )
             await client.emit("join_game", {
                 "pin": pin,
                 "name": f"Player {i+1}"
@@ -32,7 +32,9 @@ async def socket_client():
     """Create an async socket client for testing."""
     app.config["TESTING"] = True
     client = socketio.AsyncClient()
-    await client.connect(f'http://{app.config["HOST"]}:{app.config["PORT"]}')
+    await client.connect(
+        f'http://{app.config["HOST"]}:{app.config["PORT"]}', transports=['websocket']
+    )
     yield client
     if client.connected:
         await client.disconnect()
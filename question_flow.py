@@ -3,37 +3,123 @@ import pytest
 import asyncio
 import os
 import json
-import time
+import uuid
+import threading
+import importlib.util
 import aiohttp
+import pytest_asyncio
+from aiohttp import web
+from werkzeug.serving import make_server
 from datetime import datetime, timezone
 
 # Constants for test configuration
 TEST_TIMEOUT = 5  # seconds
-AUTH_SERVICE = os.getenv('AUTH_SERVICE_URL', 'http://localhost:5001')
-QUESTION_SERVICE = os.getenv('QUESTION_SERVICE_URL', 'http://localhost:5003')
-
-
-@pytest.fixture(scope="module")
+AUTH_SERVICE = os.getenv('AUTH_SERVICE_URL', 'http://127.0.0.1:5001')
+# When unset, the question service is served in-process against a fake upstream
+QUESTION_SERVICE = os.getenv('QUESTION_SERVICE_URL')
+QUESTION_SERVICE_APP = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                    'question_service', 'app.py')
+SLOW_CATEGORY = '999'  # Fake OpenTDB stalls on this category
+
+OPENTDB_PAYLOAD = {
+    'response_code': 0,
+    'results': [{
+        'question': 'Test question?',
+        'correct_answer': 'Correct',
+        'incorrect_answers': ['Wrong1', 'Wrong2', 'Wrong3'],
+        'category': 'Test',
+        'difficulty': 'medium'
+    }]
+}
+JSERVICE_PAYLOAD = [{
+    'question': 'Test Jeopardy question?',
+    'answer': 'Test answer',
+    'category': {'title': 'Test Category'}
+}]
+
+
+@pytest.fixture(scope="session")
+def event_loop():
+    """Create a single event loop shared by the session-scoped fixtures."""
+    loop = asyncio.get_event_loop_policy().new_event_loop()
+    yield loop
+    loop.close()
+
+
+@pytest_asyncio.fixture(scope="session")
 async def http_client():
-    """Create and cleanup aiohttp client session."""
-    async with aiohttp.ClientSession() as session:
+    """Create one pooled aiohttp client session for the whole test run."""
+    connector = aiohttp.TCPConnector(
+        limit=50,
+        limit_per_host=20,
+        force_close=False,
+        enable_cleanup_closed=True
+    )
+    async with aiohttp.ClientSession(
+        connector=connector,
+        timeout=aiohttp.ClientTimeout(total=TEST_TIMEOUT)
+    ) as session:
         yield session
 
 
-@pytest.fixture(scope="module")
+@pytest_asyncio.fixture(scope="session")
+async def fake_upstream():
+    """Serve canned OpenTDB and Jservice responses from localhost."""
+    async def opentdb(request):
+        if request.query.get('category') == SLOW_CATEGORY:
+            await asyncio.sleep(1)
+        return web.json_response(OPENTDB_PAYLOAD)
+
+    async def jservice(request):
+        return web.json_response(JSERVICE_PAYLOAD)
+
+    upstream = web.Application()
+    upstream.router.add_get('/api.php', opentdb)
+    upstream.router.add_get('/api/random', jservice)
+
+    runner = web.AppRunner(upstream)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    host, port = runner.addresses[0][:2]
+    yield f"http://{host}:{port}"
+    await runner.cleanup()
+
+
+@pytest.fixture(scope="session")
+def question_service(fake_upstream):
+    """Base URL of the question service under test."""
+    if QUESTION_SERVICE:
+        yield QUESTION_SERVICE
+        return
+
+    spec = importlib.util.spec_from_file_location('question_service_app', QUESTION_SERVICE_APP)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    module.OPENTDB_API_URL = f"{fake_upstream}/api.php"
+    module.JSERVICE_API_URL = f"{fake_upstream}/api"
+    module.app.config['TESTING'] = True
+
+    server = make_server('127.0.0.1', 0, module.app, threaded=True)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_port}"
+    server.shutdown()
+
+
+@pytest_asyncio.fixture(scope="session")
 async def auth_token(http_client):
     """Get authentication token for tests."""
     try:
         # Register host
         register_data = {
-            "email": f"test_{int(time.time())}@example.com",
+            "email": f"test_{uuid.uuid4().hex}@example.com",
             "password": "test123"
         }
 
         async with http_client.post(
             f"{AUTH_SERVICE}/host/register",
-            json=register_data,
-            timeout=TEST_TIMEOUT
+            json=register_data
         ) as response:
             assert response.status == 201
             register_result = await response.json()
@@ -41,8 +127,7 @@ async def auth_token(http_client):
         # Login and get token
         async with http_client.post(
             f"{AUTH_SERVICE}/host/login",
-            json=register_data,
-            timeout=TEST_TIMEOUT
+            json=register_data
         ) as response:
             assert response.status == 200
             login_result = await response.json()
@@ -51,29 +136,43 @@ async def auth_token(http_client):
         pytest.fail(f"Failed to get auth token: {str(e)}")
 
 
+@pytest_asyncio.fixture(scope="session")
+async def bank_id(http_client, question_service, auth_token):
+    """Create one question bank shared by the tests that need it."""
+    async with http_client.post(
+        f"{question_service}/questions/bank",
+        headers={'Authorization': f'Bearer {auth_token}'},
+        json={
+            "name": "Shared Test Bank",
+            "description": "Question bank shared across the test session"
+        }
+    ) as response:
+        assert response.status == 200
+        bank_data = await response.json()
+        return bank_data['id']
+
+
 @pytest.mark.asyncio
-async def test_question_bank_creation(http_client, auth_token):
+async def test_question_bank_creation(http_client, question_service, auth_token):
     """Test creating a question bank."""
     try:
         async with http_client.post(
-            f"{QUESTION_SERVICE}/questions/bank",
+            f"{question_service}/questions/bank",
             headers={'Authorization': f'Bearer {auth_token}'},
             json={
                 "name": "Test Question Bank",
                 "description": "A test question bank for trivia games"
-            },
-            timeout=TEST_TIMEOUT
+            }
         ) as response:
             assert response.status == 200
             bank_data = await response.json()
             assert 'id' in bank_data
-            return bank_data['id']
     except Exception as e:
         pytest.fail(f"Failed to create question bank: {str(e)}")
 
 
 @pytest.mark.asyncio
-async def test_add_custom_question(http_client, auth_token, bank_id):
+async def test_add_custom_question(http_client, question_service, auth_token, bank_id):
     """Test adding a custom question to a bank."""
     try:
         question_data = {
@@ -86,10 +185,9 @@ async def test_add_custom_question(http_client, auth_token, bank_id):
         }
 
         async with http_client.post(
-            f"{QUESTION_SERVICE}/questions/bank/{bank_id}/questions",
+            f"{question_service}/questions/bank/{bank_id}/questions",
             headers={'Authorization': f'Bearer {auth_token}'},
-            json=question_data,
-            timeout=TEST_TIMEOUT
+            json=question_data
         ) as response:
             assert response.status == 200
             result = await response.json()
@@ -99,14 +197,14 @@ async def test_add_custom_question(http_client, auth_token, bank_id):
 
 
 @pytest.mark.asyncio
-async def test_external_apis(http_client):
+@pytest.mark.xdist_group("external")
+async def test_external_apis(http_client, question_service):
     """Test integration with external question APIs."""
     try:
         # Test OpenTDB API
         async with http_client.get(
-            f"{QUESTION_SERVICE}/questions/external/opentdb",
-            params={'amount': '2'},
-            timeout=TEST_TIMEOUT
+            f"{question_service}/questions/external/opentdb",
+            params={'amount': '2'}
         ) as response:
             assert response.status == 200
             opentdb_questions = await response.json()
@@ -114,9 +212,8 @@ async def test_external_apis(http_client):
 
         # Test Jservice API
         async with http_client.get(
-            f"{QUESTION_SERVICE}/questions/external/jservice",
-            params={'count': '2'},
-            timeout=TEST_TIMEOUT
+            f"{question_service}/questions/external/jservice",
+            params={'count': '2'}
         ) as response:
             assert response.status == 200
             jservice_questions = await response.json()
@@ -126,13 +223,12 @@ async def test_external_apis(http_client):
 
 
 @pytest.mark.asyncio
-async def test_game_questions(http_client, auth_token):
+async def test_game_questions(http_client, question_service, auth_token):
     """Test getting questions for a game."""
     try:
         async with http_client.get(
-            f"{QUESTION_SERVICE}/questions/game/test_game_1",
-            headers={'Authorization': f'Bearer {auth_token}'},
-            timeout=TEST_TIMEOUT
+            f"{question_service}/questions/game/test_game_1",
+            headers={'Authorization': f'Bearer {auth_token}'}
         ) as response:
             assert response.status == 200
             questions = await response.json()
@@ -143,41 +239,15 @@ async def test_game_questions(http_client, auth_token):
 
 
 @pytest.mark.asyncio
-async def test_question_flow(http_client):
-    """Test complete question flow."""
-    try:
-        # Get auth token
-        token = await auth_token(http_client)
-        assert token, "Failed to get auth token"
-
-        # Create question bank
-        bank_id = await test_question_bank_creation(http_client, token)
-        assert bank_id, "Failed to create question bank"
-
-        # Add custom question
-        await test_add_custom_question(http_client, token, bank_id)
-
-        # Test external APIs
-        await test_external_apis(http_client)
-
-        # Test game questions
-        await test_game_questions(http_client, token)
-
-    except Exception as e:
-        pytest.fail(f"Question flow test failed: {str(e)}")
-
-
-@pytest.mark.asyncio
-async def test_concurrent_question_fetching(http_client):
+async def test_concurrent_question_fetching(http_client, question_service):
     """Test fetching questions concurrently."""
     try:
         # Create multiple concurrent requests
         tasks = []
         for _ in range(5):
             task = asyncio.create_task(http_client.get(
-                f"{QUESTION_SERVICE}/questions/external/opentdb",
-                params={'amount': '2'},
-                timeout=TEST_TIMEOUT
+                f"{question_service}/questions/external/opentdb",
+                params={'amount': '2'}
             ))
             tasks.append(task)
 
@@ -195,31 +265,28 @@ async def test_concurrent_question_fetching(http_client):
 
 
 @pytest.mark.asyncio
-async def test_error_handling(http_client, auth_token):
+async def test_error_handling(http_client, question_service, auth_token):
     """Test error handling scenarios."""
     try:
         # Test invalid bank ID
         async with http_client.get(
-            f"{QUESTION_SERVICE}/questions/bank/nonexistent",
-            headers={'Authorization': f'Bearer {auth_token}'},
-            timeout=TEST_TIMEOUT
+            f"{question_service}/questions/bank/nonexistent",
+            headers={'Authorization': f'Bearer {auth_token}'}
         ) as response:
             assert response.status == 404
 
         # Test invalid question data
         async with http_client.post(
-            f"{QUESTION_SERVICE}/questions/bank/test_bank/questions",
+            f"{question_service}/questions/bank/test_bank/questions",
             headers={'Authorization': f'Bearer {auth_token}'},
-            json={"invalid": "data"},
-            timeout=TEST_TIMEOUT
+            json={"invalid": "data"}
         ) as response:
             assert response.status == 400
 
         # Test unauthorized access
         async with http_client.post(
-            f"{QUESTION_SERVICE}/questions/bank",
-            json={"name": "Test Bank"},
-            timeout=TEST_TIMEOUT
+            f"{question_service}/questions/bank",
+            json={"name": "Test Bank"}
         ) as response:
             assert response.status == 401
     except Exception as e:
@@ -227,14 +294,15 @@ async def test_error_handling(http_client, auth_token):
 
 
 @pytest.mark.asyncio
-async def test_api_timeout_handling(http_client):
+async def test_api_timeout_handling(http_client, question_service):
     """Test handling of API timeouts."""
     try:
         # Test with very short timeout
         with pytest.raises(asyncio.TimeoutError):
             async with http_client.get(
-                f"{QUESTION_SERVICE}/questions/external/opentdb",
-                timeout=0.001  # 1ms timeout
+                f"{question_service}/questions/external/opentdb",
+                params={'category': SLOW_CATEGORY},
+                timeout=aiohttp.ClientTimeout(total=0.001)  # 1ms timeout
             ) as response:
                 await response.json()
     except Exception as e:
@@ -242,4 +310,4 @@ async def test_api_timeout_handling(http_client):
 
 
 if __name__ == "__main__":
-    pytest.main([__file__, '-v', '--asyncio-mode=auto'])
+    pytest.main([__file__, '-v', '--asyncio-mode=auto', '-n', 'auto', '--dist', 'loadgroup'])
@@ -1,10 +1,19 @@
 from flask import Flask, request, jsonify
 from flask_cors import CORS
 import os
+import ssl
+import asyncio
+import atexit
+import threading
+import hashlib
+import aiohttp
 import requests
+from requests.adapters import HTTPAdapter
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime
 from typing import Dict, List, Optional
 from pydantic import BaseModel, Field
+from jose import jwt, JWTError, ExpiredSignatureError
 
 app = Flask(__name__)
 CORS(app)
@@ -14,13 +23,86 @@ question_banks: Dict[str, List[dict]] = {}
 questions_cache: Dict[str, dict] = {}
 
 # External API configurations
-OPENTDB_API_URL = "https://opentdb.com/api.php"
-JSERVICE_API_URL = "https://jservice.io/api"
+OPENTDB_API_URL = os.environ.get('OPENTDB_API_URL', "https://opentdb.com/api.php")
+JSERVICE_API_URL = os.environ.get('JSERVICE_API_URL', "https://jservice.io/api")
+EXTERNAL_API_TIMEOUT = 5  # seconds
+
+# Shared outbound HTTP state so connections and TLS sessions are reused
+SESSION = requests.Session()
+SESSION.mount('https://', HTTPAdapter(pool_connections=4, pool_maxsize=32))
+SESSION.mount('http://', HTTPAdapter(pool_connections=4, pool_maxsize=32))
+SSL_CTX = ssl.create_default_context()
+SSL_CTX.set_alpn_protocols(['http/1.1'])
+
+# Async upstream fetches run on one loop per worker; the aiohttp session is
+# bound to that loop, so its DNS cache and keep-alive pool outlive a request
+_fetch_loop: Optional[asyncio.AbstractEventLoop] = None
+_fetch_loop_lock = threading.Lock()
+_http_session: Optional[aiohttp.ClientSession] = None
+
+# Tokens are signed by the auth service with this shared secret
+JWT_SECRET_KEY = os.environ.get('JWT_SECRET_KEY', 'dev_secret_key')
+JWT_ALGORITHMS = ['HS256']
+
+# HTTP caching for responses that are safe to share between clients
+CACHE_CONTROL = 'public, max-age=30, stale-while-revalidate=60'
+
+# Background warm-up of game questions, single-flight per game. Like the
+# stores above this is per-process state, so the service runs as a single
+# gunicorn worker (see gunicorn.conf.py)
+WARM_WAIT_TIMEOUT = 2 * EXTERNAL_API_TIMEOUT  # seconds
+warm_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='question-warm')
+warming: Dict[str, threading.Event] = {}
+warming_lock = threading.Lock()
+
+# Custom questions used to top up (or replace) external results
+CUSTOM_QUESTIONS = [
+    {
+        'text': 'What is the capital of France?',
+        'options': ['Paris', 'London', 'Berlin', 'Madrid'],
+        'correct_answer': 0,
+        'category': 'Geography',
+        'difficulty': 'easy',
+        'source': 'custom'
+    },
+    {
+        'text': 'Which planet is known as the Red Planet?',
+        'options': ['Mars', 'Venus', 'Jupiter', 'Saturn'],
+        'correct_answer': 0,
+        'category': 'Science',
+        'difficulty': 'easy',
+        'source': 'custom'
+    },
+    {
+        'text': 'What is the largest mammal in the world?',
+        'options': ['Blue Whale', 'African Elephant', 'Giraffe', 'Polar Bear'],
+        'correct_answer': 0,
+        'category': 'Science',
+        'difficulty': 'easy',
+        'source': 'custom'
+    },
+    {
+        'text': 'Which programming language was created by Guido van Rossum?',
+        'options': ['Python', 'Java', 'C++', 'JavaScript'],
+        'correct_answer': 0,
+        'category': 'Technology',
+        'difficulty': 'easy',
+        'source': 'custom'
+    },
+    {
+        'text': 'What is the chemical symbol for gold?',
+        'options': ['Au', 'Ag', 'Fe', 'Cu'],
+        'correct_answer': 0,
+        'category': 'Science',
+        'difficulty': 'easy',
+        'source': 'custom'
+    }
+]
 
 # Models for validation
 class Question(BaseModel):
     text: str
-    options: List[str]
+    options: List[str] = Field(min_length=2, max_length=10)
     correct_answer: int
     category: str
     difficulty: str
@@ -36,10 +118,22 @@ class QuestionBank(BaseModel):
     updated_at: datetime = Field(default_factory=datetime.utcnow)
 
 def verify_host_token(token: str) -> tuple[bool, Optional[str]]:
-    """Verify host token with auth service."""
+    """Verify host token, locally when the signature checks out.
+
+    Tokens that cannot be verified with the shared secret are sent to the
+    auth service, which stays the source of truth.
+    """
+    try:
+        payload = jwt.decode(token, JWT_SECRET_KEY, algorithms=JWT_ALGORITHMS)
+        return True, payload['host_id']
+    except ExpiredSignatureError:
+        return False, None
+    except (JWTError, KeyError):
+        pass
+
     auth_service_url = os.environ.get('AUTH_SERVICE_URL', 'http://localhost:5001')
     try:
-        response = requests.post(
+        response = SESSION.post(
             f"{auth_service_url}/host/verify",
             headers={'Authorization': f'Bearer {token}'}
         )
@@ -47,6 +141,29 @@ def verify_host_token(token: str) -> tuple[bool, Optional[str]]:
     except requests.RequestException:
         return False, None
 
+def cacheable_json(payload):
+    """Build a JSON response with an ETag and a shared Cache-Control policy.
+
+    Answers 304 Not Modified when the client already holds the same body.
+    """
+    response = jsonify(payload)
+    etag = hashlib.blake2b(response.get_data(), digest_size=8).hexdigest()
+    if request.if_none_match.contains(etag):
+        response = app.response_class(status=304)
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = CACHE_CONTROL
+    return response
+
+def uncacheable_json(payload):
+    """Build a JSON response that neither clients nor the proxy may store."""
+    response = jsonify(payload)
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+def fallback_questions_response():
+    """Serve the custom fallback questions without letting an outage get cached."""
+    return uncacheable_json(CUSTOM_QUESTIONS[:2])
+
 def format_opentdb_question(raw_question: dict) -> dict:
     """Format OpenTDB question to our standard format."""
     options = [raw_question['correct_answer']] + raw_question['incorrect_answers']
@@ -98,8 +215,8 @@ def format_jservice_question(raw_question: dict) -> dict:
 
 @app.route('/health', methods=['GET'])
 def health_check():
-    """Health check endpoint."""
-    return jsonify({
+    """Health check endpoint; never cached, so it reports this instance's state."""
+    return uncacheable_json({
         'status': 'healthy',
         'version': '1.0.0',
         'service': 'question',
@@ -167,8 +284,8 @@ def add_question(bank_id):
 
     data = request.json
     try:
-        question = Question(**data)
-        question_banks[bank_id]['questions'].append(question.dict())
+        question = Question.model_validate(data)
+        question_banks[bank_id]['questions'].append(question.model_dump(mode='json'))
         question_banks[bank_id]['updated_at'] = datetime.utcnow().isoformat()
         return jsonify({'status': 'added'})
     except Exception as e:
@@ -188,7 +305,7 @@ def get_opentdb_questions():
         if difficulty:
             params['difficulty'] = difficulty
 
-        response = requests.get(OPENTDB_API_URL, params=params)
+        response = SESSION.get(OPENTDB_API_URL, params=params)
         if response.status_code != 200:
             return jsonify({'error': 'Failed to fetch questions'}), 500
 
@@ -196,7 +313,7 @@ def get_opentdb_questions():
         formatted_questions = [
             format_opentdb_question(q) for q in data['results']
         ]
-        return jsonify(formatted_questions)
+        return cacheable_json(formatted_questions)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -206,67 +323,144 @@ def get_jservice_questions():
     try:
         count = request.args.get('count', '10')
         # Add timeout to prevent hanging
-        response = requests.get(
+        response = SESSION.get(
             f"{JSERVICE_API_URL}/random",
             params={'count': count},
-            timeout=5,
-            verify=False  # Skip SSL verification for development
+            timeout=5
         )
 
         if response.status_code != 200:
             # Fallback to custom questions if API fails
-            fallback_questions = [
-                {
-                    'text': 'What is the capital of France?',
-                    'options': ['Paris', 'London', 'Berlin', 'Madrid'],
-                    'correct_answer': 0,
-                    'category': 'Geography',
-                    'difficulty': 'easy',
-                    'source': 'custom'
-                },
-                {
-                    'text': 'Which planet is known as the Red Planet?',
-                    'options': ['Mars', 'Venus', 'Jupiter', 'Saturn'],
-                    'correct_answer': 0,
-                    'category': 'Science',
-                    'difficulty': 'easy',
-                    'source': 'custom'
-                }
-            ]
-            return jsonify(fallback_questions)
+            return fallback_questions_response()
 
         questions = response.json()
         if not isinstance(questions, list) or not questions:
-            return jsonify(fallback_questions)
+            return fallback_questions_response()
 
         formatted_questions = [
             format_jservice_question(q) for q in questions
         ]
-        return jsonify(formatted_questions)
+        return cacheable_json(formatted_questions)
     except Exception as e:
         app.logger.error(f"Jservice API error: {str(e)}")
         # Return fallback questions on error
-        return jsonify([
-            {
-                'text': 'What is the capital of France?',
-                'options': ['Paris', 'London', 'Berlin', 'Madrid'],
-                'correct_answer': 0,
-                'category': 'Geography',
-                'difficulty': 'easy',
-                'source': 'custom'
-            },
-            {
-                'text': 'Which planet is known as the Red Planet?',
-                'options': ['Mars', 'Venus', 'Jupiter', 'Saturn'],
-                'correct_answer': 0,
-                'category': 'Science',
-                'difficulty': 'easy',
-                'source': 'custom'
-            }
-        ])
+        return fallback_questions_response()
+
+def run_fetch(coro) -> Future:
+    """Schedule an upstream fetch on the worker's fetch loop, starting it on first use."""
+    global _fetch_loop
+    with _fetch_loop_lock:
+        if _fetch_loop is None:
+            _fetch_loop = asyncio.new_event_loop()
+            threading.Thread(target=_fetch_loop.run_forever, name='question-fetch', daemon=True).start()
+    return asyncio.run_coroutine_threadsafe(coro, _fetch_loop)
+
+def get_http_session() -> aiohttp.ClientSession:
+    """Return the shared aiohttp session; only call from the fetch loop."""
+    global _http_session
+    if _http_session is None or _http_session.closed:
+        _http_session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(ssl=SSL_CTX, ttl_dns_cache=300)
+        )
+    return _http_session
+
+@atexit.register
+def close_http_session() -> None:
+    """Close the shared session and stop the fetch loop at worker shutdown."""
+    if _fetch_loop is None:
+        return
+    if _http_session is not None and not _http_session.closed:
+        run_fetch(_http_session.close()).result(timeout=EXTERNAL_API_TIMEOUT)
+    _fetch_loop.call_soon_threadsafe(_fetch_loop.stop)
+
+async def fetch_opentdb(session: aiohttp.ClientSession, amount: int) -> List[dict]:
+    """Fetch and format questions from OpenTDB."""
+    async with asyncio.timeout(EXTERNAL_API_TIMEOUT):
+        async with session.get(OPENTDB_API_URL, params={'amount': str(amount)}) as response:
+            if response.status != 200:
+                return []
+            data = await response.json(content_type=None)
+
+    if data.get('response_code') != 0:
+        return []
+    return [format_opentdb_question(q) for q in data['results']]
+
+async def fetch_jservice(session: aiohttp.ClientSession, count: int) -> List[dict]:
+    """Fetch and format questions from Jservice."""
+    async with asyncio.timeout(EXTERNAL_API_TIMEOUT):
+        async with session.get(
+            f"{JSERVICE_API_URL}/random",
+            params={'count': str(count)}
+        ) as response:
+            if response.status != 200:
+                return []
+            data = await response.json(content_type=None)
+
+    if not isinstance(data, list):
+        return []
+    return [format_jservice_question(q) for q in data]
+
+async def fetch_game_questions() -> List[dict]:
+    """Build a game's question set from external sources and custom fallbacks.
+
+    Runs on the fetch loop (see run_fetch) so it can use the shared session.
+    """
+    questions = []
+
+    # Fetch both sources concurrently; each one fails independently
+    session = get_http_session()
+    opentdb, jservice = await asyncio.gather(
+        fetch_opentdb(session, 5),
+        fetch_jservice(session, 5),
+        return_exceptions=True
+    )
+
+    if isinstance(opentdb, Exception):
+        app.logger.error(f"OpenTDB API error: {str(opentdb)}")
+    else:
+        questions.extend(opentdb)
+
+    if isinstance(jservice, Exception):
+        app.logger.error(f"Jservice API error: {str(jservice)}")
+    else:
+        questions.extend(jservice)
+
+    # Add custom questions if we don't have enough
+    if len(questions) < 5:
+        questions.extend(CUSTOM_QUESTIONS[:5 - len(questions)])
+    return questions
+
+def warm_game_questions(game_id: str) -> None:
+    """Fetch and cache a game's questions; runs on the warm-up executor."""
+    try:
+        questions_cache[game_id] = run_fetch(fetch_game_questions()).result()
+    except Exception as e:
+        app.logger.error(f"Warm-up for game {game_id} failed: {str(e)}")
+    finally:
+        with warming_lock:
+            warming.pop(game_id).set()
+
+@app.route('/questions/game/<game_id>/warm', methods=['POST'])
+def warm_game(game_id):
+    """Start fetching a game's questions in the background."""
+    auth_header = request.headers.get('Authorization')
+    if not auth_header or not auth_header.startswith('Bearer '):
+        return jsonify({'error': 'Missing or invalid token'}), 401
+
+    token = auth_header.split(' ')[1]
+    is_valid, host_id = verify_host_token(token)
+    if not is_valid:
+        return jsonify({'error': 'Invalid host token'}), 401
+
+    with warming_lock:
+        if game_id not in questions_cache and game_id not in warming:
+            warming[game_id] = threading.Event()
+            warm_executor.submit(warm_game_questions, game_id)
+
+    return jsonify({'status': 'warming'}), 202
 
 @app.route('/questions/game/<game_id>', methods=['GET'])
-def get_game_questions(game_id):
+async def get_game_questions(game_id):
     """Get questions for a specific game."""
     auth_header = request.headers.get('Authorization')
     if not auth_header or not auth_header.startswith('Bearer '):
@@ -277,6 +471,11 @@ def get_game_questions(game_id):
     if not is_valid:
         return jsonify({'error': 'Invalid host token'}), 401
 
+    # Wait for an in-flight warm-up rather than fetching a second time
+    pending = warming.get(game_id)
+    if pending is not None:
+        await asyncio.to_thread(pending.wait, WARM_WAIT_TIMEOUT)
+
     # Check if we have cached questions
     if game_id in questions_cache:
         return jsonify(questions_cache[game_id])
@@ -284,90 +483,7 @@ def get_game_questions(game_id):
     # For now, return a mix of questions from different sources
     # In production, this would be based on game settings and question banks
     try:
-        questions = []
-
-        # Try to get OpenTDB questions
-        try:
-            opentdb_response = requests.get(
-                OPENTDB_API_URL,
-                params={'amount': '5'},
-                timeout=5
-            )
-            if opentdb_response.status_code == 200:
-                opentdb_data = opentdb_response.json()
-                if opentdb_data.get('response_code') == 0:
-                    questions.extend([
-                        format_opentdb_question(q)
-                        for q in opentdb_data['results']
-                    ])
-        except Exception as e:
-            app.logger.error(f"OpenTDB API error: {str(e)}")
-
-        # Try to get Jservice questions
-        try:
-            jservice_response = requests.get(
-                f"{JSERVICE_API_URL}/random",
-                params={'count': '5'},
-                timeout=5,
-                verify=False
-            )
-            if jservice_response.status_code == 200:
-                jservice_data = jservice_response.json()
-                if isinstance(jservice_data, list):
-                    questions.extend([
-                        format_jservice_question(q)
-                        for q in jservice_data
-                    ])
-        except Exception as e:
-            app.logger.error(f"Jservice API error: {str(e)}")
-
-        # Always ensure we have enough questions by adding custom ones
-        custom_questions = [
-            {
-                'text': 'What is the capital of France?',
-                'options': ['Paris', 'London', 'Berlin', 'Madrid'],
-                'correct_answer': 0,
-                'category': 'Geography',
-                'difficulty': 'easy',
-                'source': 'custom'
-            },
-            {
-                'text': 'Which planet is known as the Red Planet?',
-                'options': ['Mars', 'Venus', 'Jupiter', 'Saturn'],
-                'correct_answer': 0,
-                'category': 'Science',
-                'difficulty': 'easy',
-                'source': 'custom'
-            },
-            {
-                'text': 'What is the largest mammal in the world?',
-                'options': ['Blue Whale', 'African Elephant', 'Giraffe', 'Polar Bear'],
-                'correct_answer': 0,
-                'category': 'Science',
-                'difficulty': 'easy',
-                'source': 'custom'
-            },
-            {
-                'text': 'Which programming language was created by Guido van Rossum?',
-                'options': ['Python', 'Java', 'C++', 'JavaScript'],
-                'correct_answer': 0,
-                'category': 'Technology',
-                'difficulty': 'easy',
-                'source': 'custom'
-            },
-            {
-                'text': 'What is the chemical symbol for gold?',
-                'options': ['Au', 'Ag', 'Fe', 'Cu'],
-                'correct_answer': 0,
-                'category': 'Science',
-                'difficulty': 'easy',
-                'source': 'custom'
-            }
-        ]
-
-        # Add custom questions if we don't have enough
-        if len(questions) < 5:
-            questions.extend(custom_questions[:5 - len(questions)])
+        questions = await asyncio.wrap_future(run_fetch(fetch_game_questions()))
 
         # Cache questions for this game
         questions_cache[game_id] = questions
@@ -375,8 +491,9 @@ def get_game_questions(game_id):
     except Exception as e:
         app.logger.error(f"Game questions error: {str(e)}")
         # Return custom questions as fallback
-        return jsonify(custom_questions)
+        return jsonify(CUSTOM_QUESTIONS)
 
 if __name__ == '__main__':
+    # Local debugging only; production runs under gunicorn (see gunicorn.conf.py)
     port = int(os.environ.get('PORT', 5003))
     app.run(host='0.0.0.0', port=port)
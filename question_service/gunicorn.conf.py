@@ -0,0 +1,29 @@
+"""Gunicorn configuration for running the question service in production.
+
+Usage: gunicorn -c gunicorn.conf.py app:app
+"""
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 5003)}"
+
+# gevent workers overlap the blocking upstream HTTP calls instead of
+# serializing every request behind one socket read
+worker_class = 'gevent'
+worker_connections = 1000
+
+# Question banks, the game question cache and in-flight warm-ups live in
+# process memory, so a warm-up and the fetch it prepares must reach the same
+# process. Exactly one worker until that state moves to shared storage;
+# gevent's worker_connections provides the concurrency.
+workers = 1
+
+timeout = 30
+keepalive = 5
+
+
+def on_starting(server):
+    """Refuse to start with more workers; each would hold its own copy of the state."""
+    if server.cfg.workers != 1:
+        raise RuntimeError(
+            f"question service must run with exactly one worker, got {server.cfg.workers}"
+        )
@@ -0,0 +1,31 @@
+"""Shared fixtures for question service tests."""
+import sys
+import asyncio
+import pytest
+from unittest.mock import patch
+
+# Skip writing .pyc files for the service modules imported by the tests
+sys.dont_write_bytecode = True
+
+
+@pytest.fixture(scope="session")
+def event_loop():
+    """Run every async test and fixture on one loop for the session."""
+    loop = asyncio.new_event_loop()
+    yield loop
+    loop.close()
+
+
+@pytest.fixture(scope="session")
+def app_instance():
+    """Import and configure the Flask app once per session."""
+    from app import app
+    app.config['TESTING'] = True
+    return app
+
+
+@pytest.fixture(scope="session", autouse=True)
+def _block_network(app_instance):
+    """Patch the service's outbound HTTP once so no test reaches the network."""
+    with patch('app.SESSION.get') as mock_get, patch('app.SESSION.post') as mock_post:
+        yield mock_get, mock_post
@@ -1,17 +1,24 @@
 """Database operations with Cosmos DB."""
-from azure.cosmos import CosmosClient, PartitionKey, exceptions
+from azure.core import MatchConditions
+from azure.cosmos import PartitionKey, exceptions
+from azure.cosmos.aio import CosmosClient
+from azure.core.pipeline.transport import AioHttpTransport
+from cachetools import TTLCache
+import aiohttp
+import asyncio
+import concurrent.futures
+import copy
 import os
 import random
-import string
+import secrets
 import logging
+import threading
 import time
-from datetime import datetime, UTC
-from typing import Dict, List, Optional, Any, Callable, TypeVar, Generic
+from datetime import datetime, timedelta, UTC
+from typing import Dict, List, Optional, Any, Callable, Coroutine, Tuple, TypeVar
 from functools import wraps
-from contextlib import contextmanager
 from .validation import (
     validate_schema,
-    optimistic_concurrency,
     HostSchema,
     GameSchema,
     QuestionSchema,
@@ -24,80 +31,210 @@ class TransactionError(Exception):
     """Custom exception for transaction errors."""
     pass
 
-class Transaction(Generic[T]):
-    """Class to handle database transactions."""
-    def __init__(self, db: 'CosmosDB'):
-        self.db = db
-        self.operations: List[Callable[[], None]] = []
-        self.compensations: List[Callable[[], None]] = []
-        self.committed = False
-
-    def add_operation(self, operation: Callable[[], T], compensation: Callable[[], None]) -> None:
-        """Add an operation and its compensation to the transaction."""
-        self.operations.append(operation)
-        self.compensations.append(compensation)
-
-    def commit(self) -> None:
-        """Commit all operations in the transaction."""
-        try:
-            # Execute all operations
-            for operation in self.operations:
-                operation()
-            self.committed = True
-            logger.info("Transaction committed successfully")
-        except Exception as e:
-            logger.error(f"Transaction failed: {str(e)}")
-            self.rollback()
-            raise TransactionError(f"Transaction failed: {str(e)}")
-
-    def rollback(self) -> None:
-        """Rollback all operations in the transaction."""
-        if not self.committed:
-            # Execute compensations in reverse order
-            for compensation in reversed(self.compensations):
-                try:
-                    compensation()
-                except Exception as e:
-                    logger.error(f"Rollback operation failed: {str(e)}")
-            logger.info("Transaction rolled back")
-
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def retry_on_throttle(max_retries: int = 3, initial_wait: float = 1.0) -> Callable:
+# Values of the /type partition key. The SDK takes the key value itself,
+# so these plain strings are shared by every call site.
+HOST_PARTITION = 'host'
+GAME_PARTITION = 'game'
+BANK_PARTITION = 'question_bank'
+SAGA_PARTITION = 'saga'
+
+# Gateway connection settings
+COSMOS_POOL_SIZE = int(os.environ.get('COSMOS_POOL_SIZE', '100'))
+COSMOS_CONNECTION_TIMEOUT = 30  # seconds
+COSMOS_BATCH_LIMIT = 100  # max operations per transactional batch
+COSMOS_PATCH_LIMIT = 10  # max operations per patch request
+SAGA_TIMEOUT_MINUTES = 5  # pending sagas older than this are reconciled
+SAGA_RECONCILE_INTERVAL = 60  # seconds between reconciliation sweeps
+
+QUESTION_SCHEMA = QuestionSchema()
+
+# The container's unique keys. Cosmos treats a missing path as null, and only
+# one null per logical partition is allowed, so every document fills the
+# paths it has no real value for with its own id
+UNIQUE_KEY_PATHS = ('email', 'pin')
+
+# Short-lived cache for host/game point lookups
+LOOKUP_CACHE_SIZE = 4096
+LOOKUP_CACHE_TTL = 5  # seconds
+
+# Game fields where the newest write wins outright, so a stale write can be dropped
+LAST_WRITER_WINS_FIELDS = frozenset({'scores'})
+
+# Server-side merge for game updates. Each game keeps a version counter and
+# the version that last wrote each field, so an update made against an older
+# version still applies when none of its fields changed since then. Write
+# times are compared as epoch microseconds (updated_ts), never as strings.
+MERGE_GAME_SPROC = 'mergeGameUpdate'
+MERGE_GAME_SPROC_BODY = '''
+function mergeGameUpdate(id, updates, baseVersion, clientTs, lastWriterWinsFields, updatedAt, updatedTs) {
+    var collection = getContext().getCollection();
+    var response = getContext().getResponse();
+    var fields = Object.keys(updates);
+
+    var accepted = collection.readDocument(collection.getAltLink() + '/docs/' + id, {}, function (err, doc) {
+        if (err) {
+            if (err.number === 404) {
+                response.setBody(null);
+                return;
+            }
+            throw err;
+        }
+
+        // Thomas Write Rule: an older last-writer-wins update is already superseded
+        if (clientTs !== null && clientTs < (doc.updated_ts || 0) && fields.every(function (field) {
+            return lastWriterWinsFields.indexOf(field) >= 0;
+        })) {
+            response.setBody(doc);
+            return;
+        }
+
+        var version = doc.version || 0;
+        var fieldVersions = doc.field_versions || {};
+        if (baseVersion !== null && baseVersion !== version) {
+            fields.forEach(function (field) {
+                if ((fieldVersions[field] || 0) > baseVersion) {
+                    throw new Error('GameUpdateConflict: ' + field + ' changed after version ' + baseVersion);
+                }
+            });
+        }
+
+        version += 1;
+        fields.forEach(function (field) {
+            doc[field] = updates[field];
+            fieldVersions[field] = version;
+        });
+        doc.version = version;
+        doc.field_versions = fieldVersions;
+        doc.updated_at = updatedAt;
+        doc.updated_ts = updatedTs;
+
+        var replaced = collection.replaceDocument(doc._self, doc, { etag: doc._etag }, function (err, result) {
+            if (err) throw err;
+            response.setBody(result);
+        });
+        if (!replaced) throw new Error('Game update was not accepted, retry');
+    });
+    if (!accepted) throw new Error('Game read was not accepted, retry');
+}
+'''
+
+# Process-wide retry budget: each throttle retry spends RETRY_COST tokens and
+# an operation that retried gives its tokens back once it succeeds, so a
+# throttling storm stops retrying instead of multiplying the load that caused it
+RETRY_QUOTA_CAPACITY = 500
+RETRY_COST = 5
+_retry_quota = RETRY_QUOTA_CAPACITY
+_retry_quota_lock = threading.Lock()
+
+EPOCH = datetime(1970, 1, 1, tzinfo=UTC)
+
+# (epoch second, formatted prefix) of the last timestamp handed out
+_iso_second = (0, '')
+
+def _now_iso() -> str:
+    """Return the current UTC time in the same ISO 8601 form as datetime.isoformat()."""
+    global _iso_second
+    seconds, nanos = divmod(time.time_ns(), 1_000_000_000)
+    if seconds != _iso_second[0]:
+        _iso_second = (seconds, time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(seconds)))
+    return f'{_iso_second[1]}.{nanos // 1000:06d}+00:00'
+
+def with_unique_keys(doc: Dict[str, Any]) -> Dict[str, Any]:
+    """Fill any unique-key path a document lacks with its id, so types coexist."""
+    for path in UNIQUE_KEY_PATHS:
+        if doc.get(path) is None:
+            doc[path] = doc['id']
+    return doc
+
+def _epoch_us(timestamp: str) -> int:
+    """Convert an ISO 8601 timestamp to epoch microseconds; naive times are UTC."""
+    moment = datetime.fromisoformat(timestamp)
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=UTC)
+    return (moment - EPOCH) // timedelta(microseconds=1)
+
+def _take_retry_tokens() -> bool:
+    """Spend RETRY_COST tokens from the retry quota if enough are left."""
+    global _retry_quota
+    with _retry_quota_lock:
+        if _retry_quota < RETRY_COST:
+            return False
+        _retry_quota -= RETRY_COST
+        return True
+
+def _refund_retry_tokens(tokens: int) -> None:
+    """Return tokens to the retry quota, up to its capacity."""
+    global _retry_quota
+    with _retry_quota_lock:
+        _retry_quota = min(RETRY_QUOTA_CAPACITY, _retry_quota + tokens)
+
+def retry_on_throttle(max_retries: int = 3, initial_wait: float = 1.0, max_wait: float = 30.0) -> Callable:
     """Decorator to retry operations when requests are throttled."""
     def decorator(func: Callable) -> Callable:
         @wraps(func)
-        def wrapper(*args, **kwargs):
+        async def wrapper(*args, **kwargs):
             retries = 0
-            wait_time = initial_wait
 
-            while retries < max_retries:
+            while True:
                 try:
-                    return func(*args, **kwargs)
+                    result = await func(*args, **kwargs)
+                    if retries:
+                        _refund_retry_tokens(retries * RETRY_COST)
+                    return result
                 except exceptions.CosmosHttpResponseError as e:
                     if e.status_code == 429:  # Too Many Requests
-                        if retries == max_retries - 1:
+                        if retries >= max_retries - 1:
                             logger.error(f"Max retries ({max_retries}) exceeded for operation")
                             raise
+                        if not _take_retry_tokens():
+                            logger.error("Retry quota exhausted, not retrying throttled operation")
+                            raise
 
-                        # Get retry after duration from headers, default to exponential backoff
-                        retry_after = float(e.headers.get('x-ms-retry-after-ms',
-                                                        wait_time * 1000)) / 1000
+                        # Full jitter over a capped exponential backoff spreads out
+                        # clients throttled together; never retry before the server asks
+                        backoff = min(max_wait, initial_wait * 2 ** retries)
+                        server_wait = float(e.headers.get('x-ms-retry-after-ms', 0)) / 1000
+                        retry_after = max(server_wait, random.uniform(0, backoff))
 
-                        logger.warning(f"Request throttled. Retrying in {retry_after} seconds...")
-                        time.sleep(retry_after)
+                        logger.warning(f"Request throttled. Retrying in {retry_after:.3f} seconds...")
+                        await asyncio.sleep(retry_after)
                         retries += 1
-                        wait_time *= 2  # Exponential backoff
                     else:
                         raise
-            return func(*args, **kwargs)
         return wrapper
     return decorator
 
+# Loop that runs CosmosDB coroutines for synchronous callers
+_sync_loop: Optional[asyncio.AbstractEventLoop] = None
+_sync_loop_lock = threading.Lock()
+
+def _get_sync_loop() -> asyncio.AbstractEventLoop:
+    """Return the shared background loop, starting it on first use."""
+    global _sync_loop
+    with _sync_loop_lock:
+        if _sync_loop is None:
+            _sync_loop = asyncio.new_event_loop()
+            threading.Thread(target=_sync_loop.run_forever, name='cosmosdb-loop', daemon=True).start()
+    return _sync_loop
+
+def run_sync(coro: Coroutine[Any, Any, T]) -> T:
+    """Run a CosmosDB coroutine from synchronous code and return its result.
+
+    The async client is tied to the event loop it first runs on, so every
+    synchronous caller shares one background loop instead of starting its own.
+    """
+    return asyncio.run_coroutine_threadsafe(coro, _get_sync_loop()).result()
+
+def run_background(coro: Coroutine[Any, Any, T]) -> 'concurrent.futures.Future[T]':
+    """Start a CosmosDB coroutine on the shared loop without waiting for it."""
+    return asyncio.run_coroutine_threadsafe(coro, _get_sync_loop())
+
 class CosmosDB:
-    """Database class with transaction support."""
+    """Database class with saga support for multi-partition writes."""
     _instance = None
     _client = None
     _database = None
@@ -110,70 +247,102 @@ class CosmosDB:
         return cls._instance
 
     def __init__(self):
-        """Initialize database connection with transaction support."""
+        """Initialize database settings; call initialize() before first use."""
         if CosmosDB._client is None:
-            endpoint = os.environ.get('COSMOS_ENDPOINT')
-            key = os.environ.get('COSMOS_KEY')
-            if not endpoint or not key:
+            if not os.environ.get('COSMOS_ENDPOINT') or not os.environ.get('COSMOS_KEY'):
                 raise ValueError("COSMOS_ENDPOINT and COSMOS_KEY environment variables are required")
 
-            # Initialize Cosmos client with connection pooling
-            CosmosDB._client = CosmosClient(
-                url=endpoint,
-                credential=key
-            )
-
-            # Get or create database
-            CosmosDB._database = CosmosDB._client.create_database_if_not_exists('trivia_db')
-
-            # Single container for all data types
-            CosmosDB._container = CosmosDB._database.create_container_if_not_exists(
-                id='trivia_data',
-                partition_key=PartitionKey(path='/type'),
-                unique_key_policy={'uniqueKeys': [
-                    {'paths': ['/email']},  # For hosts
-                    {'paths': ['/pin']},    # For games
-                ]},
-                offer_throughput=400  # Single container with 400 RU/s
-            )
+        self.client = CosmosDB._client
+        self.database = CosmosDB._database
+        self.container = CosmosDB._container
+        if not hasattr(self, '_lookup_cache'):
+            # Keyed by (type, lookup value); misses are never cached
+            self._lookup_cache = TTLCache(maxsize=LOOKUP_CACHE_SIZE, ttl=LOOKUP_CACHE_TTL)
+
+    async def initialize(self) -> 'CosmosDB':
+        """Connect and make sure the database and container exist."""
+        # Created here rather than at import so the lock belongs to the loop
+        # that runs initialize(); nothing awaits between the check and the set
+        if not hasattr(self, '_init_lock'):
+            self._init_lock = asyncio.Lock()
+        async with self._init_lock:
+            if CosmosDB._client is None:
+                # The Python SDK only speaks Gateway mode, so keep a large pool of
+                # keep-alive connections to the gateway instead of a TCP direct link
+                session = aiohttp.ClientSession(
+                    connector=aiohttp.TCPConnector(limit=COSMOS_POOL_SIZE, ttl_dns_cache=300)
+                )
+
+                # Initialize Cosmos client with connection pooling
+                client = CosmosClient(
+                    url=os.environ['COSMOS_ENDPOINT'],
+                    credential=os.environ['COSMOS_KEY'],
+                    connection_mode='Gateway',
+                    connection_timeout=COSMOS_CONNECTION_TIMEOUT,
+                    enable_endpoint_discovery=True,
+                    transport=AioHttpTransport(session=session, session_owner=False)
+                )
+
+                # Get or create database
+                database = await client.create_database_if_not_exists('trivia_db')
+
+                # Single container for all data types
+                CosmosDB._container = await database.create_container_if_not_exists(
+                    id='trivia_data',
+                    partition_key=PartitionKey(path='/type'),
+                    unique_key_policy={'uniqueKeys': [
+                        {'paths': ['/email']},  # For hosts
+                        {'paths': ['/pin']},    # For games
+                    ]},
+                    offer_throughput=400  # Single container with 400 RU/s
+                )
+                await CosmosDB._register_stored_procedure(
+                    CosmosDB._container, MERGE_GAME_SPROC, MERGE_GAME_SPROC_BODY
+                )
+                CosmosDB._database = database
+                CosmosDB._client = client
 
         self.client = CosmosDB._client
         self.database = CosmosDB._database
         self.container = CosmosDB._container
+        return self
+
+    @staticmethod
+    async def _register_stored_procedure(container, sproc_id: str, body: str) -> None:
+        """Create a stored procedure, or replace it so deploys pick up changes."""
+        sproc = {'id': sproc_id, 'body': body}
+        try:
+            await container.scripts.create_stored_procedure(body=sproc)
+        except exceptions.CosmosResourceExistsError:
+            await container.scripts.replace_stored_procedure(sproc=sproc_id, body=sproc)
+
+    def _cache_get(self, key: Tuple[str, str]) -> Optional[Dict[str, Any]]:
+        """Return a private copy of a cached document, or None on a miss."""
+        doc = self._lookup_cache.get(key)
+        return copy.deepcopy(doc) if doc is not None else None
+
+    def _cache_put(self, key: Tuple[str, str], doc: Dict[str, Any]) -> None:
+        """Cache a copy of a document so later changes by the caller don't leak in."""
+        self._lookup_cache[key] = copy.deepcopy(doc)
 
     def _generate_id(self, prefix: str) -> str:
         """Generate a random ID with a prefix"""
-        random_str = ''.join(random.choices(string.ascii_lowercase + string.digits, k=8))
-        return f"{prefix}_{random_str}"
-
-    @contextmanager
-    def transaction(self):
-        """Context manager for database transactions."""
-        transaction = Transaction(self)
-        try:
-            yield transaction
-            if not transaction.committed:
-                transaction.commit()
-        except Exception as e:
-            transaction.rollback()
-            raise
-        finally:
-            if not transaction.committed:
-                transaction.rollback()
+        # 64 random bits keep collisions out of reach at any realistic document count
+        return f"{prefix}_{secrets.token_hex(8)}"
 
     @retry_on_throttle()
     @validate_schema(HostSchema())
-    @optimistic_concurrency
-    def create_host(self, host_data: Dict[str, Any]) -> Dict[str, Any]:
+    async def create_host(self, host_data: Dict[str, Any]) -> Dict[str, Any]:
         """Create a new host record."""
         try:
             if 'id' not in host_data:
                 host_data['id'] = self._generate_id('host')
-            host_data['type'] = 'host'
-            host_data['created_at'] = datetime.now(UTC).isoformat()
+            host_data['type'] = HOST_PARTITION
+            host_data['created_at'] = _now_iso()
 
             logger.info(f"Creating host with ID: {host_data['id']}")
-            result = self.container.create_item(body=host_data)
+            self._lookup_cache.pop((HOST_PARTITION, host_data['email']), None)
+            result = await self.container.create_item(body=with_unique_keys(host_data))
             logger.info(f"Successfully created host: {result['id']}")
             return result
 
@@ -184,69 +353,180 @@ class CosmosDB:
             logger.error(f"Error creating host: {str(e)}")
             raise
 
+    async def try_create_host(self, host_data: Dict[str, Any]) -> Tuple[Dict[str, Any], bool]:
+        """Create a host, letting the /email unique key reject duplicates.
+
+        Returns:
+            (created host, True), or (host_data, False) if the email is taken
+        """
+        try:
+            return await self.create_host(host_data), True
+        except exceptions.CosmosResourceExistsError:
+            return host_data, False
+
     @retry_on_throttle()
-    def get_host_by_email(self, email: str) -> Optional[Dict[str, Any]]:
+    async def get_host_by_email(self, email: str) -> Optional[Dict[str, Any]]:
         """Get host by email."""
+        key = (HOST_PARTITION, email)
+        cached = self._cache_get(key)
+        if cached is not None:
+            return cached
+
         try:
             logger.info(f"Fetching host with email: {email}")
-            query = "SELECT * FROM c WHERE c.type = 'host' AND c.email = @email"
+            query = "SELECT * FROM c WHERE c.email = @email"
             params = [{"name": "@email", "value": email}]
-            results = list(self.container.query_items(
+            # Emails are unique, so stop at the first match
+            host = None
+            async for item in self.container.query_items(
                 query=query,
                 parameters=params,
-                enable_cross_partition_query=True
-            ))
-            if results:
+                partition_key=HOST_PARTITION  # type is partition key
+            ):
+                host = item
+                break
+
+            if host:
                 logger.info(f"Found host with email: {email}")
+                self._cache_put(key, host)
             else:
                 logger.info(f"No host found with email: {email}")
-            return results[0] if results else None
+            return host
 
         except Exception as e:
             logger.error(f"Error fetching host by email: {str(e)}")
             raise
 
-    def create_host_with_bank(self, host_data: Dict[str, Any], bank_data: Dict[str, Any]) -> Dict[str, Any]:
-        """Create a host and their initial question bank in a transaction."""
-        with self.transaction() as transaction:
-            # Add host creation operation
-            def create_host_op():
-                return self.create_host(host_data)
+    async def create_host_with_bank(self, host_data: Dict[str, Any], bank_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Create a host and their initial question bank as a saga.
+
+        The documents live in different partitions, so they cannot share a
+        Cosmos batch. A saga record listing both is written first and removed
+        once both creates succeed; if the creates fail and the undo cannot
+        finish, reconcile_sagas() completes it later.
+        """
+        HostSchema().validate(host_data)
+        if 'id' not in host_data:
+            host_data['id'] = self._generate_id('host')
+        if 'id' not in bank_data:
+            bank_data['id'] = self._generate_id('bank')
+        bank_data['host_id'] = host_data['id']
+
+        saga = await self._begin_saga([
+            (host_data['id'], HOST_PARTITION),
+            (bank_data['id'], BANK_PARTITION)
+        ])
+
+        # The creates are independent, so issue them together
+        results = await asyncio.gather(
+            self.create_host(host_data),
+            self.create_question_bank(bank_data),
+            return_exceptions=True
+        )
+        failure = next((r for r in results if isinstance(r, Exception)), None)
+        if failure is None:
+            await self._end_saga(saga)
+            return host_data
+
+        logger.error(f"Saga {saga['id']} failed: {str(failure)}")
+        await self._compensate_saga(saga)
+        raise TransactionError(f"Transaction failed: {str(failure)}")
 
-            def delete_host_comp():
+    @retry_on_throttle()
+    async def _begin_saga(self, steps: List[Tuple[str, str]]) -> Dict[str, Any]:
+        """Durably record the (id, type) documents a multi-partition write will create."""
+        saga = {
+            'id': self._generate_id('saga'),
+            'type': SAGA_PARTITION,
+            'steps': [{'id': item_id, 'type': item_type} for item_id, item_type in steps],
+            'created_at': _now_iso()
+        }
+        return await self.container.create_item(body=with_unique_keys(saga))
+
+    @retry_on_throttle()
+    async def _end_saga(self, saga: Dict[str, Any]) -> None:
+        """Drop a saga record once its writes are settled."""
+        try:
+            await self.container.delete_item(item=saga['id'], partition_key=SAGA_PARTITION)
+        except exceptions.CosmosResourceNotFoundError:
+            pass
+
+    async def _compensate_saga(self, saga: Dict[str, Any]) -> None:
+        """Delete a saga's documents; the record stays for reconcile_sagas() on failure."""
+        try:
+            for step in saga['steps']:
                 try:
-                    self.container.delete_item(
-                        item=host_data['id'],
-                        partition_key='host'
-                    )
+                    await self.container.delete_item(item=step['id'], partition_key=step['type'])
                 except exceptions.CosmosResourceNotFoundError:
                     pass
+            await self._end_saga(saga)
+            logger.info(f"Saga {saga['id']} rolled back")
+        except Exception as e:
+            logger.error(f"Rollback of saga {saga['id']} failed, left for reconciliation: {str(e)}")
 
-            transaction.add_operation(create_host_op, delete_host_comp)
+    @retry_on_throttle()
+    async def reconcile_sagas(self, minutes: int = SAGA_TIMEOUT_MINUTES) -> None:
+        """Settle sagas left pending by a crash or a failed rollback.
 
-            # Add question bank creation operation
-            def create_bank_op():
-                bank_data['host_id'] = host_data['id']
-                return self.create_question_bank(bank_data)
+        A saga whose documents all exist finished its writes and only lost
+        its cleanup, so just the record is dropped; otherwise the partial
+        writes are undone. Each saga is claimed with an ETag check first, so
+        concurrent sweepers never settle the same saga twice.
 
-            def delete_bank_comp():
+        Args:
+            minutes: Age after which a pending saga is considered abandoned
+        """
+        cutoff = (datetime.now(UTC) - timedelta(minutes=minutes)).isoformat(timespec='microseconds')
+        # A claim older than the cutoff belongs to a sweeper that died mid-way
+        query = ("SELECT * FROM c WHERE c.created_at < @cutoff"
+                 " AND (NOT IS_DEFINED(c.claimed_at) OR c.claimed_at < @cutoff)")
+        async for saga in self.container.query_items(
+            query=query,
+            parameters=[{"name": "@cutoff", "value": cutoff}],
+            partition_key=SAGA_PARTITION  # type is partition key
+        ):
+            # Every service worker runs a sweeper; only the one that claims a saga settles it
+            if not await self._claim_saga(saga):
+                continue
+
+            present = 0
+            for step in saga['steps']:
                 try:
-                    self.container.delete_item(
-                        item=bank_data['id'],
-                        partition_key='question_bank'
-                    )
+                    await self.container.read_item(item=step['id'], partition_key=step['type'])
+                    present += 1
                 except exceptions.CosmosResourceNotFoundError:
                     pass
 
-            transaction.add_operation(create_bank_op, delete_bank_comp)
+            if present == len(saga['steps']):
+                await self._end_saga(saga)
+            else:
+                await self._compensate_saga(saga)
 
-            # Commit will happen automatically when exiting context
-            return host_data
+    async def _claim_saga(self, saga: Dict[str, Any]) -> bool:
+        """Stamp a saga as being reconciled; False if another sweeper got there first."""
+        try:
+            await self.container.replace_item(
+                item=saga['id'],
+                body={**saga, 'claimed_at': _now_iso()},
+                etag=saga['_etag'],
+                match_condition=MatchConditions.IfNotModified
+            )
+            return True
+        except (exceptions.CosmosAccessConditionFailedError, exceptions.CosmosResourceNotFoundError):
+            return False
+
+    async def reconcile_sagas_periodically(self, interval: float = SAGA_RECONCILE_INTERVAL) -> None:
+        """Run reconcile_sagas() every interval seconds until cancelled."""
+        while True:
+            try:
+                await self.reconcile_sagas()
+            except Exception as e:
+                logger.error(f"Saga reconciliation failed: {str(e)}")
+            await asyncio.sleep(interval)
 
     @retry_on_throttle()
     @validate_schema(GameSchema())
-    @optimistic_concurrency
-    def create_game(self, game_data: Dict[str, Any]) -> Dict[str, Any]:
+    async def create_game(self, game_data: Dict[str, Any]) -> Dict[str, Any]:
         """Create a new game."""
         try:
             if 'pin' not in game_data:
@@ -254,11 +534,11 @@ class CosmosDB:
 
             # Use PIN as ID for games
             game_data['id'] = game_data['pin']
-            game_data['type'] = 'game'
-            game_data['created_at'] = datetime.now(UTC).isoformat()
+            game_data['type'] = GAME_PARTITION
+            game_data['created_at'] = _now_iso()
 
             logger.info(f"Creating game with PIN: {game_data['pin']}")
-            result = self.container.create_item(body=game_data)
+            result = await self.container.create_item(body=with_unique_keys(game_data))
             logger.info(f"Successfully created game with PIN: {result['pin']}")
             return result
 
@@ -270,11 +550,13 @@ class CosmosDB:
             raise
 
     @retry_on_throttle()
-    def get_game_by_pin(self, pin: str) -> Optional[Dict[str, Any]]:
+    async def get_game_by_pin(self, pin: str, use_cache: bool = True) -> Optional[Dict[str, Any]]:
         """Get game by PIN.
 
         Args:
             pin: The game's PIN number
+            use_cache: Serve from (and fill) the short-lived lookup cache;
+                pass False when the caller is about to modify the game
 
         Returns:
             The game document if found, None otherwise
@@ -282,13 +564,21 @@ class CosmosDB:
         Note:
             This operation will retry up to 3 times if throttled
         """
+        key = (GAME_PARTITION, pin)
+        if use_cache:
+            cached = self._cache_get(key)
+            if cached is not None:
+                return cached
+
         try:
             logger.info(f"Fetching game with PIN: {pin}")
-            result = self.container.read_item(
+            result = await self.container.read_item(
                 item=pin,
-                partition_key='game'  # type is partition key
+                partition_key=GAME_PARTITION  # type is partition key
             )
             logger.info(f"Found game with PIN: {pin}")
+            if use_cache:
+                self._cache_put(key, result)
             return result
         except exceptions.CosmosResourceNotFoundError:
             logger.info(f"No game found with PIN: {pin}")
@@ -298,48 +588,71 @@ class CosmosDB:
             return None
 
     @retry_on_throttle()
-    @validate_schema(GameSchema())
-    @optimistic_concurrency
-    def update_game(self, pin: str, updates: Dict[str, Any]) -> Dict[str, Any]:
+    async def update_game(self, pin: str, updates: Dict[str, Any]) -> Dict[str, Any]:
         """Update game data with retry logic for throttled requests.
 
+        The merge runs in a stored procedure, so concurrent updates to
+        different fields of the same game never conflict.
+
         Args:
             pin: The game's PIN number
-            updates: Dictionary of fields to update
+            updates: Dictionary of fields to update, optionally with a
+                'client_ts' ISO timestamp of when the client made the change
+                and the 'version' of the game the change was based on
 
         Returns:
-            Updated game document
+            Updated game document, or the current one if the update was
+            already superseded
 
         Raises:
             ValueError: If game not found
+            ValidationError: If a field in updates changed after 'version',
+                or 'client_ts' is not an ISO 8601 timestamp
             CosmosHttpResponseError: For other Cosmos DB errors
         """
         try:
             logger.info(f"Updating game with PIN: {pin}")
-            game = self.get_game_by_pin(pin)
-            if not game:
+            updates = dict(updates)
+            client_ts = updates.pop('client_ts', None)
+            base_version = updates.pop('version', None)
+            updates.pop('field_versions', None)
+            updates.pop('updated_ts', None)
+
+            # Offsets and precision vary between clients, so compare instants
+            if client_ts is not None:
+                try:
+                    client_ts = _epoch_us(client_ts)
+                except (TypeError, ValueError):
+                    raise ValidationError(f"Invalid client_ts: {client_ts!r}", 'client_ts')
+            updated_at = _now_iso()
+
+            result = await self.container.scripts.execute_stored_procedure(
+                sproc=MERGE_GAME_SPROC,
+                partition_key=GAME_PARTITION,
+                params=[pin, updates, base_version, client_ts,
+                        sorted(LAST_WRITER_WINS_FIELDS), updated_at, _epoch_us(updated_at)]
+            )
+            if result is None:
                 raise ValueError(f"Game with PIN {pin} not found")
 
-            game.update(updates)
-            game['updated_at'] = datetime.now(UTC).isoformat()
-
-            result = self.container.replace_item(
-                item=game['id'],
-                body=game
-            )
+            self._lookup_cache.pop((GAME_PARTITION, pin), None)
             logger.info(f"Successfully updated game: {pin}")
             return result
 
         except ValueError:
             logger.error(f"Game with PIN {pin} not found")
             raise
+        except exceptions.CosmosHttpResponseError as e:
+            if 'GameUpdateConflict' in str(e.message):
+                raise ValidationError("Concurrent update detected. Please try again.")
+            logger.error(f"Error updating game: {str(e)}")
+            raise
         except Exception as e:
             logger.error(f"Error updating game: {str(e)}")
             raise
 
     @retry_on_throttle()
-    @optimistic_concurrency
-    def create_question_bank(self, bank_data: Dict[str, Any]) -> Dict[str, Any]:
+    async def create_question_bank(self, bank_data: Dict[str, Any]) -> Dict[str, Any]:
         """Create a new question bank with retry logic.
 
         Args:
@@ -354,11 +667,12 @@ class CosmosDB:
         try:
             if 'id' not in bank_data:
                 bank_data['id'] = self._generate_id('bank')
-            bank_data['type'] = 'question_bank'
-            bank_data['created_at'] = datetime.now(UTC).isoformat()
+            bank_data['type'] = BANK_PARTITION
+            bank_data.setdefault('questions', [])
+            bank_data['created_at'] = _now_iso()
 
             logger.info(f"Creating question bank with ID: {bank_data['id']}")
-            result = self.container.create_item(body=bank_data)
+            result = await self.container.create_item(body=with_unique_keys(bank_data))
             logger.info(f"Successfully created question bank: {result['id']}")
             return result
 
@@ -367,7 +681,7 @@ class CosmosDB:
             raise
 
     @retry_on_throttle()
-    def get_question_banks_by_host(self, host_id: str) -> List[Dict[str, Any]]:
+    async def get_question_banks_by_host(self, host_id: str) -> List[Dict[str, Any]]:
         """Get all question banks for a host with retry logic.
 
         Args:
@@ -381,13 +695,13 @@ class CosmosDB:
         """
         try:
             logger.info(f"Fetching question banks for host: {host_id}")
-            query = "SELECT * FROM c WHERE c.type = 'question_bank' AND c.host_id = @host_id"
+            query = "SELECT * FROM c WHERE c.host_id = @host_id"
             params = [{"name": "@host_id", "value": host_id}]
-            results = list(self.container.query_items(
+            results = [item async for item in self.container.query_items(
                 query=query,
                 parameters=params,
-                enable_cross_partition_query=True
-            ))
+                partition_key=BANK_PARTITION  # type is partition key
+            )]
             logger.info(f"Found {len(results)} question banks for host: {host_id}")
             return results
 
@@ -396,8 +710,7 @@ class CosmosDB:
             raise
 
     @retry_on_throttle()
-    @optimistic_concurrency
-    def add_questions_to_bank(self, bank_id: str, questions: List[Dict[str, Any]]) -> Dict[str, Any]:
+    async def add_questions_to_bank(self, bank_id: str, questions: List[Dict[str, Any]]) -> Dict[str, Any]:
         """Add questions to a bank with retry logic and validation.
 
         Args:
@@ -413,27 +726,38 @@ class CosmosDB:
             CosmosHttpResponseError: For other Cosmos DB errors
         """
         # Validate each question against schema
-        question_schema = QuestionSchema()
-        for question in questions:
-            question_schema.validate(question)
+        QUESTION_SCHEMA.validate_many(questions)
 
         try:
             logger.info(f"Adding questions to bank: {bank_id}")
-            bank = self.container.read_item(
-                item=bank_id,
-                partition_key='question_bank'  # type is partition key
-            )
-
-            if 'questions' not in bank:
-                bank['questions'] = []
-
-            bank['questions'].extend(questions)
-            bank['updated_at'] = datetime.now(UTC).isoformat()
-
-            result = self.container.replace_item(
-                item=bank['id'],
-                body=bank
-            )
+            # Append server-side so only the new questions cross the wire; each
+            # patch carries a slice of the questions plus the updated_at stamp
+            now = _now_iso()
+            per_patch = COSMOS_PATCH_LIMIT - 1
+            patches = [
+                [{'op': 'add', 'path': '/questions/-', 'value': question}
+                 for question in questions[start:start + per_patch]]
+                + [{'op': 'set', 'path': '/updated_at', 'value': now}]
+                for start in range(0, max(len(questions), 1), per_patch)
+            ]
+
+            if len(patches) == 1:
+                result = await self.container.patch_item(
+                    item=bank_id,
+                    partition_key=BANK_PARTITION,  # type is partition key
+                    patch_operations=patches[0]
+                )
+            else:
+                # Larger uploads go as transactional batches of patches
+                for start in range(0, len(patches), COSMOS_BATCH_LIMIT):
+                    results = await self.container.execute_item_batch(
+                        batch_operations=[
+                            ('patch', (bank_id, patch))
+                            for patch in patches[start:start + COSMOS_BATCH_LIMIT]
+                        ],
+                        partition_key=BANK_PARTITION
+                    )
+                result = results[-1]['resourceBody']
             logger.info(f"Successfully added {len(questions)} questions to bank: {bank_id}")
             return result
 
@@ -445,7 +769,7 @@ class CosmosDB:
             raise
 
     @retry_on_throttle()
-    def delete_game(self, pin: str) -> None:
+    async def delete_game(self, pin: str) -> None:
         """Delete a game with retry logic.
 
         Args:
@@ -457,9 +781,10 @@ class CosmosDB:
         """
         try:
             logger.info(f"Deleting game with PIN: {pin}")
-            self.container.delete_item(
+            self._lookup_cache.pop((GAME_PARTITION, pin), None)
+            await self.container.delete_item(
                 item=pin,
-                partition_key='game'  # type is partition key
+                partition_key=GAME_PARTITION  # type is partition key
             )
             logger.info(f"Successfully deleted game: {pin}")
 
@@ -470,33 +795,56 @@ class CosmosDB:
             raise
 
     @retry_on_throttle()
-    def cleanup_old_games(self, hours: int = 24) -> None:
+    async def cleanup_old_games(self, hours: int = 24) -> None:
         """Clean up games older than specified hours with retry logic.
 
         Args:
             hours: Number of hours after which games are considered old
 
         Note:
-            This operation will retry individual game deletions if throttled
+            Old games are read a page of up to 100 at a time and each page is
+            deleted as one batch; a failed batch falls back to individual
+            deletions, which retry if throttled
         """
         try:
             logger.info(f"Starting cleanup of games older than {hours} hours")
-            cutoff = datetime.now(UTC).isoformat()
-            query = f"SELECT * FROM c WHERE c.type = 'game' AND c.created_at < '{cutoff}'"
+            # Same fixed-width format as _now_iso so string comparison orders correctly
+            cutoff = (datetime.now(UTC) - timedelta(hours=hours)).isoformat(timespec='microseconds')
+            # A game's id is its PIN, so the bare id values are all that is needed
+            query = "SELECT VALUE c.id FROM c WHERE c.created_at < @cutoff"
+            params = [{"name": "@cutoff", "value": cutoff}]
 
-            old_games = list(self.container.query_items(
+            pages = self.container.query_items(
                 query=query,
-                enable_cross_partition_query=True
-            ))
-
-            logger.info(f"Found {len(old_games)} old games to clean up")
-            for game in old_games:
+                parameters=params,
+                partition_key=GAME_PARTITION,  # type is partition key
+                max_item_count=COSMOS_BATCH_LIMIT  # one page per delete batch
+            ).by_page()
+
+            # Games share the 'game' partition, so delete each page as one transactional batch
+            removed = 0
+            async for page in pages:
+                chunk = [pin async for pin in page]
+                if not chunk:
+                    continue
+                for pin in chunk:
+                    self._lookup_cache.pop((GAME_PARTITION, pin), None)
                 try:
-                    self.delete_game(game['pin'])
-                except Exception as e:
-                    logger.error(f"Error deleting game {game['pin']} during cleanup: {str(e)}")
-
-            logger.info("Game cleanup completed")
+                    await self.container.execute_item_batch(
+                        batch_operations=[('delete', (pin,)) for pin in chunk],
+                        partition_key=GAME_PARTITION
+                    )
+                except exceptions.CosmosBatchOperationError as e:
+                    # Batches are all-or-nothing; fall back to per-game deletes
+                    logger.warning(f"Batch delete failed, deleting games individually: {str(e)}")
+                    for pin in chunk:
+                        try:
+                            await self.delete_game(pin)
+                        except Exception as e:
+                            logger.error(f"Error deleting game {pin} during cleanup: {str(e)}")
+                removed += len(chunk)
+
+            logger.info(f"Game cleanup completed; processed {removed} old games")
 
         except Exception as e:
             logger.error(f"Error during game cleanup: {str(e)}")
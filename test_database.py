@@ -1,413 +1,825 @@
 """Test database operations and functionality."""
 import pytest
 import asyncio
-import random
-import string
+import base64
+import itertools
+import json
+import os
+import secrets
 from datetime import datetime, timedelta, UTC
+from types import SimpleNamespace
 from unittest.mock import patch, AsyncMock
+from azure.core import MatchConditions
 from azure.cosmos import exceptions
-from shared.cosmosdb import CosmosDB
+from cachetools import TTLCache
+from shared import cosmosdb
+from shared.cosmosdb import (
+    CosmosDB,
+    COSMOS_BATCH_LIMIT,
+    LOOKUP_CACHE_SIZE,
+    LOOKUP_CACHE_TTL,
+    HOST_PARTITION,
+    GAME_PARTITION,
+    BANK_PARTITION,
+    SAGA_PARTITION,
+    UNIQUE_KEY_PATHS,
+    TransactionError,
+    with_unique_keys
+)
 from shared.validation import ValidationError
 
+try:
+    import uvloop
+except ImportError:  # uvloop is not available on Windows
+    uvloop = None
+
 # Constants for test configuration
 TEST_TIMEOUT = 5  # seconds
+# Ids and emails carry the xdist worker and a per-run token, so workers and
+# concurrent runs sharing the container never write the same documents
+WORKER_ID = os.environ.get('PYTEST_XDIST_WORKER', 'main')
+RUN_ID = f"{WORKER_ID}_{secrets.token_hex(3)}"
+TEST_HOST_ID = f"test_host_{RUN_ID}"
 MAX_RETRIES = 3
 CLEANUP_HOURS = 24
+# Any creation time past the cleanup window will do, so compute one per run
+OLD_GAME_CREATED_AT = (datetime.now(UTC) - timedelta(hours=CLEANUP_HOURS + 1)).isoformat()
+
+# Leftovers from crashed runs, by partition; every game is a test game. Only
+# documents older than STALE_AFTER match, so runs in progress are never touched
+STALE_AFTER = timedelta(hours=1)
+CLEANUP_QUERIES = {
+    HOST_PARTITION: "SELECT VALUE c.id FROM c WHERE c._ts < @before AND (STARTSWITH(c.id, 'test_') OR STARTSWITH(c.id, 'host_'))",
+    BANK_PARTITION: "SELECT VALUE c.id FROM c WHERE c._ts < @before AND (STARTSWITH(c.id, 'test_') OR STARTSWITH(c.id, 'bank_'))",
+    GAME_PARTITION: "SELECT VALUE c.id FROM c WHERE c._ts < @before",
+}
+
+# Shared payloads; create_* stamps id/type/created_at, so tests spread copies
+PASSWORD_HASH = '$2b$12$' + 'a' * 53  # bcrypt-length hash
+WAITING_GAME = {'host_id': TEST_HOST_ID, 'status': 'waiting'}
+QUESTIONS = [
+    {
+        'text': 'What is 2+2?',
+        'options': ['3', '4', '5', '6'],
+        'correct_answer': 1
+    },
+    {
+        'text': 'What color is the sky?',
+        'options': ['Red', 'Green', 'Blue', 'Yellow'],
+        'correct_answer': 2
+    }
+]
 
 
 def generate_id(prefix=''):
-    """Generate a random ID with optional prefix."""
-    random_str = ''.join(random.choices(string.ascii_lowercase + string.digits, k=8))
+    """Generate a random ID for this run, with optional prefix."""
+    random_str = f"{RUN_ID}_{secrets.token_hex(4)}"
     return f"{prefix}_{random_str}" if prefix else random_str
 
 
+def generate_email(name):
+    """Generate an email address unique to this run."""
+    return f"{name}_{RUN_ID}@test.com"
+
+
 def generate_pin():
     """Generate a random 6-digit PIN."""
-    return ''.join(random.choices(string.digits, k=6))
+    return f"{secrets.randbelow(1_000_000):06d}"
 
 
-@pytest.fixture(scope="function", autouse=True)
-async def setup_and_teardown():
-    """Setup and teardown for each test."""
-    # Setup
-    db = CosmosDB()
-    await cleanup_test_data(db)
+@pytest.fixture(scope="session")
+def event_loop():
+    """Share one loop; the async Cosmos client stays bound to the loop it started on."""
+    loop = uvloop.new_event_loop() if uvloop else asyncio.new_event_loop()
+    yield loop
+    loop.close()
 
-    yield db
 
-    # Teardown
-    await asyncio.sleep(0.1)  # Allow any pending events to complete
+@pytest.fixture(scope="session")
+async def db_session():
+    """Connect once per test process, sweeping up what crashed runs left behind."""
+    db = await CosmosDB().initialize()
     await cleanup_test_data(db)
+    return db
+
+
+class RecordingContainer:
+    """Container proxy that remembers the (type, id) of every document created through it."""
+
+    def __init__(self, container):
+        self._container = container
+        self.created = set()
+
+    def __getattr__(self, name):
+        return getattr(self._container, name)
+
+    async def create_item(self, body, **kwargs):
+        result = await self._container.create_item(body=body, **kwargs)
+        self.created.add((body['type'], body['id']))
+        return result
+
+    async def upsert_item(self, body, **kwargs):
+        result = await self._container.upsert_item(body=body, **kwargs)
+        self.created.add((body['type'], body['id']))
+        return result
+
+    async def execute_item_batch(self, batch_operations, partition_key, **kwargs):
+        results = await self._container.execute_item_batch(
+            batch_operations=batch_operations, partition_key=partition_key, **kwargs
+        )
+        for operation, args, *_ in batch_operations:
+            if operation in ('create', 'upsert'):
+                self.created.add((partition_key, args[0]['id']))
+        return results
+
+
+class FakeContainer:
+    """In-memory container for tests that only exercise client-side logic.
+
+    Enforces the real container's unique keys, including Cosmos treating a
+    missing path as null, and ETag preconditions on replace.
+    """
+
+    def __init__(self):
+        self._items = {}
+        self._etags = itertools.count(1)
+
+    def _store(self, key, body):
+        self._items[key] = {**body, '_etag': str(next(self._etags))}
+        return dict(self._items[key])
+
+    async def create_item(self, body, **kwargs):
+        key = (body['type'], body['id'])
+        if key in self._items:
+            raise exceptions.CosmosResourceExistsError(
+                message=f"Entity with the specified id already exists: {body['id']}"
+            )
+        for path in UNIQUE_KEY_PATHS:
+            if any(partition == body['type'] and item.get(path) == body.get(path)
+                   for (partition, _), item in self._items.items()):
+                raise exceptions.CosmosResourceExistsError(
+                    message=f"Unique index constraint violation on /{path}"
+                )
+        return self._store(key, body)
+
+    async def read_item(self, item, partition_key, **kwargs):
+        if (partition_key, item) not in self._items:
+            raise exceptions.CosmosResourceNotFoundError(message=f"Entity not found: {item}")
+        return dict(self._items[(partition_key, item)])
+
+    async def replace_item(self, item, body, etag=None, match_condition=None, **kwargs):
+        key = (body['type'], item)
+        if key not in self._items:
+            raise exceptions.CosmosResourceNotFoundError(message=f"Entity not found: {item}")
+        if match_condition == MatchConditions.IfNotModified and self._items[key]['_etag'] != etag:
+            raise exceptions.CosmosAccessConditionFailedError(message=f"ETag mismatch: {item}")
+        return self._store(key, body)
+
+    async def delete_item(self, item, partition_key, **kwargs):
+        if self._items.pop((partition_key, item), None) is None:
+            raise exceptions.CosmosResourceNotFoundError(message=f"Entity not found: {item}")
+
+
+def fake_db():
+    """Return a CosmosDB bound to a FakeContainer instead of the shared client."""
+    db = object.__new__(CosmosDB)
+    db.client = None
+    db.database = None
+    db.container = FakeContainer()
+    db._lookup_cache = TTLCache(maxsize=LOOKUP_CACHE_SIZE, ttl=LOOKUP_CACHE_TTL)
+    return db
+
+
+@pytest.fixture(scope="function")
+async def live_db(db_session):
+    """Remove only the documents each test wrote."""
+    # CosmosDB() re-reads the class attribute, so record there as well
+    container = CosmosDB._container
+    recorder = RecordingContainer(container)
+    CosmosDB._container = db_session.container = recorder
+    # Tasks already running (SDK, aiohttp, other fixtures) are not this test's
+    existing = asyncio.all_tasks()
+
+    yield db_session
+
+    # Teardown: let anything the test left running finish before cleaning up
+    pending = asyncio.all_tasks() - existing - {asyncio.current_task()}
+    if pending:
+        await asyncio.wait(pending, timeout=TEST_TIMEOUT)
+    CosmosDB._container = db_session.container = container
+    await delete_created(db_session, recorder.created)
+
+
+@pytest.fixture(scope="function", autouse=True)
+def setup_and_teardown(request):
+    """Setup and teardown for each test; unit tests never touch Cosmos DB."""
+    if request.node.get_closest_marker('unit'):
+        return fake_db()
+    return request.getfixturevalue('live_db')
+
+
+def stale_parameters():
+    """Query parameters selecting documents last written before STALE_AFTER ago."""
+    before = int((datetime.now(UTC) - STALE_AFTER).timestamp())
+    return [{'name': '@before', 'value': before}]
 
 
 async def cleanup_test_data(db):
-    """Clean up any existing test data."""
+    """Clean up test data abandoned by earlier runs."""
     try:
-        # Query for test documents and any existing games
-        query = """
-        SELECT * FROM c WHERE
-        STARTSWITH(c.id, 'test_') OR
-        STARTSWITH(c.id, 'host_') OR
-        STARTSWITH(c.id, 'bank_') OR
-        c.type = 'game'
-        """
-        items = list(db.container.query_items(
-            query=query,
-            enable_cross_partition_query=True
+        # One single-partition query per type instead of a cross-partition scan
+        parameters = stale_parameters()
+        await asyncio.gather(*(
+            delete_test_documents(db, partition, query, parameters)
+            for partition, query in CLEANUP_QUERIES.items()
         ))
-
-        # Delete test documents
-        for item in items:
-            await db.container.delete_item(
-                item=item['id'],
-                partition_key=item['type']
-            )
     except Exception as e:
         pytest.fail(f"Cleanup failed: {str(e)}")
 
 
-@pytest.mark.asyncio
-async def test_host_operations(setup_and_teardown):
-    """Test host operations."""
-    db = setup_and_teardown
-    try:
-        # Test host creation
-        test_id = generate_id('host')
-        host_data = {
-            'id': test_id,
-            'email': 'test@example.com',
-            'name': 'Test Host',
-            'password_hash': 'dummy_hash'
-        }
+async def delete_created(db, created):
+    """Delete the (type, id) documents a test created, a batch per partition."""
+    by_partition = {}
+    for partition, item_id in created:
+        by_partition.setdefault(partition, []).append(item_id)
 
-        # Create host
-        host = await db.create_host(host_data)
-        assert host['id'] == test_id
+    await asyncio.gather(*(
+        delete_batch(db, partition, ids[start:start + COSMOS_BATCH_LIMIT])
+        for partition, ids in by_partition.items()
+        for start in range(0, len(ids), COSMOS_BATCH_LIMIT)
+    ))
 
-        # Test host retrieval
-        retrieved_host = await db.get_host_by_email(host_data['email'])
-        assert retrieved_host['email'] == host_data['email']
 
-        # Test unique email constraint
-        with pytest.raises(exceptions.CosmosResourceExistsError):
-            await db.create_host(host_data)
+async def delete_test_documents(db, partition, query, parameters=None):
+    """Stream matching ids from one partition and delete them a page at a time."""
+    pages = db.container.query_items(
+        query=query,
+        parameters=parameters,
+        partition_key=partition,
+        max_item_count=COSMOS_BATCH_LIMIT
+    ).by_page()
+    async for page in pages:
+        ids = [item_id async for item_id in page]
+        if ids:
+            await delete_batch(db, partition, ids)
 
-    except Exception as e:
-        pytest.fail(f"Test failed: {str(e)}")
+
+async def delete_batch(db, partition, ids):
+    """Delete ids from one partition as a single batch, falling back to per-item deletes."""
+    try:
+        await db.container.execute_item_batch(
+            batch_operations=[('delete', (item_id,)) for item_id in ids],
+            partition_key=partition
+        )
+    except exceptions.CosmosBatchOperationError:
+        # A batch is all-or-nothing, so retry the items one by one
+        for item_id in ids:
+            try:
+                await db.container.delete_item(item=item_id, partition_key=partition)
+            except exceptions.CosmosResourceNotFoundError:
+                pass
+
+
+async def read_game(db, pin):
+    """Point-read a game from the container, bypassing the lookup cache."""
+    try:
+        return await db.container.read_item(item=pin, partition_key=GAME_PARTITION)
+    except exceptions.CosmosResourceNotFoundError:
+        return None
 
 
 @pytest.mark.asyncio
-async def test_game_operations(setup_and_teardown):
-    """Test game operations."""
+async def test_host_operations(setup_and_teardown):
+    """Test host operations."""
     db = setup_and_teardown
-    try:
-        # Test game creation
-        test_pin = generate_pin()
-        game_data = {
-            'id': test_pin,
-            'pin': test_pin,
-            'host_id': 'test_host',
-            'status': 'waiting',
-            'players': []
-        }
+    # Test host creation
+    test_id = generate_id('host')
+    host_data = {
+        'id': test_id,
+        'email': generate_email('test'),
+        'name': 'Test Host',
+        'password_hash': PASSWORD_HASH
+    }
 
-        # Create game
-        game = await db.create_game(game_data)
-        assert game['pin'] == test_pin
+    # Create host
+    host = await db.create_host(host_data)
+    assert host['id'] == test_id
 
-        # Test game retrieval
-        retrieved_game = await db.get_game_by_pin(game_data['pin'])
-        assert retrieved_game['pin'] == game_data['pin']
+    # Test host retrieval
+    retrieved_host = await db.get_host_by_email(host_data['email'])
+    assert retrieved_host['email'] == host_data['email']
 
-        # Test game update
-        updates = {
-            'status': 'active',
-            'players': [{'id': 'player1', 'name': 'Player 1'}]
-        }
-        updated_game = await db.update_game(game_data['pin'], updates)
-        assert updated_game['status'] == 'active'
+    # Test unique email constraint
+    with pytest.raises(exceptions.CosmosResourceExistsError):
+        await db.create_host(host_data)
 
-        # Test unique PIN constraint
-        with pytest.raises(exceptions.CosmosResourceExistsError):
-            await db.create_game(game_data)
 
-    except Exception as e:
-        pytest.fail(f"Test failed: {str(e)}")
+@pytest.mark.asyncio
+async def test_game_operations(setup_and_teardown):
+    """Test game operations."""
+    db = setup_and_teardown
+    # Test game creation
+    test_pin = generate_pin()
+    game_data = {**WAITING_GAME, 'pin': test_pin}
+
+    # Create game
+    game = await db.create_game(game_data)
+    assert game['pin'] == test_pin
+
+    # Test game retrieval
+    retrieved_game = await db.get_game_by_pin(game_data['pin'])
+    assert retrieved_game['pin'] == game_data['pin']
+
+    # Test game update
+    updates = {
+        'status': 'active',
+        'players': [{'id': 'player1', 'name': 'Player 1'}]
+    }
+    updated_game = await db.update_game(game_data['pin'], updates)
+    assert updated_game['status'] == 'active'
+
+    # Test unique PIN constraint
+    with pytest.raises(exceptions.CosmosResourceExistsError):
+        await db.create_game(game_data)
 
 
 @pytest.mark.asyncio
 async def test_question_bank_operations(setup_and_teardown):
     """Test question bank operations."""
     db = setup_and_teardown
-    try:
-        # Test question bank creation
-        test_id = generate_id('bank')
-        bank_data = {
-            'id': test_id,
-            'host_id': 'test_host',
-            'name': 'Test Bank',
-            'questions': []
-        }
+    # Test question bank creation
+    test_id = generate_id('bank')
+    bank_data = {
+        'id': test_id,
+        'host_id': TEST_HOST_ID,
+        'name': 'Test Bank',
+        'questions': []
+    }
 
-        # Create bank
-        bank = await db.create_question_bank(bank_data)
-        assert bank['id'] == test_id
-
-        # Test adding questions
-        questions = [
-            {
-                'text': 'What is 2+2?',
-                'options': ['3', '4', '5', '6'],
-                'correct_answer': 1
-            },
-            {
-                'text': 'What color is the sky?',
-                'options': ['Red', 'Green', 'Blue', 'Yellow'],
-                'correct_answer': 2
-            }
-        ]
-
-        updated_bank = await db.add_questions_to_bank(bank['id'], questions)
-        assert len(updated_bank['questions']) == 2
-
-        # Test question bank retrieval
-        banks = await db.get_question_banks_by_host('test_host')
-        assert len(banks) > 0
+    # Create bank
+    bank = await db.create_question_bank(bank_data)
+    assert bank['id'] == test_id
 
-    except Exception as e:
-        pytest.fail(f"Test failed: {str(e)}")
+    # Test adding questions
+    updated_bank = await db.add_questions_to_bank(bank['id'], QUESTIONS)
+    assert len(updated_bank['questions']) == 2
+
+    # Test question bank retrieval
+    banks = await db.get_question_banks_by_host(TEST_HOST_ID)
+    assert len(banks) > 0
 
 
 @pytest.mark.asyncio
 async def test_cleanup_operations(setup_and_teardown):
     """Test cleanup operations."""
     db = setup_and_teardown
-    try:
-        # Create an old game
-        test_pin = generate_pin()
-        old_game_data = {
-            'id': test_pin,
-            'pin': test_pin,
-            'host_id': 'test_host',
-            'status': 'completed',
-            'created_at': (datetime.now(UTC) - timedelta(hours=CLEANUP_HOURS + 1)).isoformat()
-        }
-
-        # Create old game
-        old_game = await db.create_game(old_game_data)
-        assert old_game['pin'] == test_pin
-
-        # Run cleanup
-        await db.cleanup_old_games(hours=CLEANUP_HOURS)
-
-        # Verify game was deleted
-        deleted_game = await db.get_game_by_pin(old_game_data['pin'])
-        assert deleted_game is None
-
-    except Exception as e:
-        pytest.fail(f"Test failed: {str(e)}")
-
-
+    # Create an old game
+    test_pin = generate_pin()
+    old_game_data = {
+        'id': test_pin,
+        'pin': test_pin,
+        'host_id': TEST_HOST_ID,
+        'status': 'completed',
+        'type': GAME_PARTITION,
+        'created_at': OLD_GAME_CREATED_AT
+    }
+
+    # Write the old game directly; create_game would stamp it with the current time
+    old_game = await db.container.create_item(body=with_unique_keys(old_game_data))
+    assert old_game['pin'] == test_pin
+
+    # Run cleanup
+    await db.cleanup_old_games(hours=CLEANUP_HOURS)
+
+    # Verify game was deleted
+    deleted_game = await read_game(db, old_game_data['pin'])
+    assert deleted_game is None
+
+
+@pytest.mark.unit
 @pytest.mark.asyncio
 async def test_retry_logic(setup_and_teardown):
     """Test retry logic for throttled operations."""
     db = setup_and_teardown
-    try:
-        with patch.object(db.container, 'create_item') as mock_create:
-            # Mock throttling response
-            throttle_error = exceptions.CosmosHttpResponseError(
-                message="Too Many Requests",
-                status_code=429,
-                headers={'x-ms-retry-after-ms': '1000'}
-            )
-            success_response = {'id': 'test_id', 'type': 'host'}
-            mock_create.side_effect = [throttle_error, throttle_error, success_response]
-
-            host_data = {
-                'email': 'retry@test.com',
-                'name': 'Retry Test',
-                'password_hash': 'test_hash'
-            }
-            result = await db.create_host(host_data)
-            assert result['id'] == 'test_id'
-
-    except Exception as e:
-        pytest.fail(f"Test failed: {str(e)}")
+    # Mock throttling response
+    throttle_error = exceptions.CosmosHttpResponseError(
+        message="Too Many Requests",
+        status_code=429
+    )
+    # Headers normally come from the HTTP response, which a mock doesn't have
+    throttle_error.headers = {'x-ms-retry-after-ms': '1000'}
+    success_response = {'id': 'test_id', 'type': 'host'}
+    host_data = {
+        'email': 'retry@test.com',
+        'name': 'Retry Test',
+        'password_hash': PASSWORD_HASH
+    }
+
+    with patch.object(db.container, 'create_item') as mock_create, \
+            patch('shared.cosmosdb.asyncio.sleep', new=AsyncMock()) as mock_sleep, \
+            patch('shared.cosmosdb._retry_quota', 100):
+        mock_create.side_effect = [throttle_error, throttle_error, success_response]
+        result = await db.create_host(dict(host_data))
+        assert result['id'] == 'test_id'
+        # The retries' tokens come back once the operation succeeds
+        assert cosmosdb._retry_quota == 100
+
+        # Jittered waits never undercut the server's retry-after or exceed the backoff cap
+        waits = [call.args[0] for call in mock_sleep.await_args_list]
+        assert len(waits) == 2
+        assert waits[0] == 1.0
+        assert 1.0 <= waits[1] <= 2.0
+
+    # With the retry quota spent, throttling fails fast instead of retrying
+    with patch.object(db.container, 'create_item') as mock_create, \
+            patch('shared.cosmosdb.asyncio.sleep', new=AsyncMock()) as mock_sleep, \
+            patch('shared.cosmosdb._retry_quota', 0):
+        mock_create.side_effect = [throttle_error, success_response]
+        with pytest.raises(exceptions.CosmosHttpResponseError):
+            await db.create_host(dict(host_data))
+        mock_sleep.assert_not_awaited()
+
+        # Operations that never retried refund nothing
+        mock_create.side_effect = None
+        mock_create.return_value = success_response
+        await db.create_host(dict(host_data))
+        assert cosmosdb._retry_quota == 0
 
 
 @pytest.mark.asyncio
 async def test_connection_pooling(setup_and_teardown):
     """Test connection pooling and concurrent operations."""
     db = setup_and_teardown
-    try:
-        # Test singleton pattern
-        db1 = CosmosDB()
-        db2 = CosmosDB()
-        assert db1._client is db2._client
-
-        # Test concurrent operations
-        test_pins = [generate_pin() for _ in range(5)]
-        game_data_list = [{
-            'pin': pin,
-            'host_id': 'test_host',
-            'status': 'waiting',
-            'players': []
-        } for pin in test_pins]
-
-        # Create games concurrently
-        tasks = [db.create_game(game_data) for game_data in game_data_list]
-        await asyncio.gather(*tasks)
-
-        # Verify all games were created
-        for pin in test_pins:
-            game = await db.get_game_by_pin(pin)
-            assert game is not None
+    # Test singleton pattern
+    db1 = CosmosDB()
+    db2 = CosmosDB()
+    assert db1._client is db2._client
 
-    except Exception as e:
-        pytest.fail(f"Test failed: {str(e)}")
+    # Test concurrent operations
+    test_pins = [generate_pin() for _ in range(5)]
+    game_data_list = [{**WAITING_GAME, 'pin': pin} for pin in test_pins]
+
+    # Create games concurrently
+    tasks = [db.create_game(game_data) for game_data in game_data_list]
+    await asyncio.gather(*tasks)
+
+    # Verify all games were created
+    games = await asyncio.gather(*(read_game(db, pin) for pin in test_pins))
+    assert all(game is not None for game in games)
+
+
+@pytest.mark.asyncio
+async def test_batched_game_creation(setup_and_teardown):
+    """Test creating several games in one transactional batch."""
+    db = setup_and_teardown
+    test_pins = [generate_pin() for _ in range(5)]
+    operations = [
+        ('create', (with_unique_keys({**WAITING_GAME, 'id': pin, 'pin': pin, 'type': GAME_PARTITION}),))
+        for pin in test_pins
+    ]
+
+    # Every game shares the 'game' partition, so one round trip creates them all
+    results = await db.container.execute_item_batch(
+        batch_operations=operations,
+        partition_key=GAME_PARTITION
+    )
+    assert len(results) == len(test_pins)
+
+    games = await asyncio.gather(*(read_game(db, pin) for pin in test_pins))
+    assert all(game is not None for game in games)
 
 
 @pytest.mark.asyncio
 async def test_error_handling(setup_and_teardown):
     """Test error handling scenarios."""
     db = setup_and_teardown
-    try:
-        # Test not found error
-        nonexistent_game = await db.get_game_by_pin('nonexistent_pin')
-        assert nonexistent_game is None
-
-        # Test invalid data error
-        with pytest.raises(ValueError):
-            await db.create_game({})  # Missing required PIN
-
-        # Test duplicate creation
-        test_pin = generate_pin()
-        game_data = {
-            'pin': test_pin,
-            'host_id': 'test_host',
-            'status': 'waiting'
-        }
+    # Test not found error
+    nonexistent_game = await db.get_game_by_pin('nonexistent_pin')
+    assert nonexistent_game is None
+
+    # Test invalid data error
+    with pytest.raises(ValueError):
+        await db.create_game({})  # Missing required PIN
+
+    # Test duplicate creation
+    test_pin = generate_pin()
+    game_data = {**WAITING_GAME, 'pin': test_pin}
+    await db.create_game(game_data)
+    with pytest.raises(exceptions.CosmosResourceExistsError):
         await db.create_game(game_data)
-        with pytest.raises(exceptions.CosmosResourceExistsError):
-            await db.create_game(game_data)
-
-    except Exception as e:
-        pytest.fail(f"Test failed: {str(e)}")
 
 
+@pytest.mark.unit
 @pytest.mark.asyncio
 async def test_schema_validation(setup_and_teardown):
     """Test schema validation."""
     db = setup_and_teardown
-    try:
-        # Test host schema validation
-        with pytest.raises(ValidationError):
-            invalid_host = {
-                'email': 'not_an_email',  # Invalid email format
-                'password_hash': '123'     # Too short for hash
-            }
-            await db.create_host(invalid_host)
-
-        # Test game schema validation
-        with pytest.raises(ValidationError):
-            invalid_game = {
-                'pin': '123',          # PIN too short
-                'host_id': 'test_host',
-                'status': 'invalid'    # Invalid status
-            }
-            await db.create_game(invalid_game)
-
-        # Test question validation
-        with pytest.raises(ValidationError):
-            invalid_questions = [{
-                'text': 'Test question',
-                'options': ['Only one option'],  # Not enough options
-                'correct_answer': 0
-            }]
-            await db.add_questions_to_bank('test_bank', invalid_questions)
+    # Test host schema validation
+    with pytest.raises(ValidationError):
+        invalid_host = {
+            'email': 'not_an_email',  # Invalid email format
+            'password_hash': '123'     # Too short for hash
+        }
+        await db.create_host(invalid_host)
+
+    # Test game schema validation
+    with pytest.raises(ValidationError):
+        invalid_game = {
+            'pin': '123',          # PIN too short
+            'host_id': TEST_HOST_ID,
+            'status': 'invalid'    # Invalid status
+        }
+        await db.create_game(invalid_game)
 
-    except Exception as e:
-        pytest.fail(f"Test failed: {str(e)}")
+    # Test question validation
+    with pytest.raises(ValidationError):
+        invalid_questions = [{
+            'text': 'Test question',
+            'options': ['Only one option'],  # Not enough options
+            'correct_answer': 0
+        }]
+        await db.add_questions_to_bank('test_bank', invalid_questions)
+
+
+@pytest.mark.asyncio
+async def test_obsolete_score_update_skipped(setup_and_teardown):
+    """Test that stale last-writer-wins updates are dropped."""
+    db = setup_and_teardown
+    test_pin = generate_pin()
+    game_data = {**WAITING_GAME, 'pin': test_pin}
+    await db.create_game(game_data)
+    game = await db.update_game(test_pin, {'status': 'active'})
+
+    # A score update stamped before the last write is already superseded
+    stale_ts = (datetime.now(UTC) - timedelta(minutes=1)).isoformat()
+    result = await db.update_game(test_pin, {
+        'scores': {'player1': 10},
+        'client_ts': stale_ts
+    })
+    assert result['version'] == game['version']
+    assert 'player1' not in result.get('scores', {})
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_client_ts_normalized(setup_and_teardown):
+    """Test that the same instant in different ISO formats reaches the merge as one value."""
+    db = setup_and_teardown
+    execute = AsyncMock(return_value={**WAITING_GAME, 'id': '123456', 'pin': '123456'})
+    db.container.scripts = SimpleNamespace(execute_stored_procedure=execute)
+
+    for client_ts in ('2024-05-01T12:00:00+02:00', '2024-05-01T10:00:00Z', '2024-05-01T10:00:00.000000'):
+        await db.update_game('123456', {'scores': {'player1': 10}, 'client_ts': client_ts})
+    assert len({call.kwargs['params'][3] for call in execute.await_args_list}) == 1
+
+    with pytest.raises(ValidationError):
+        await db.update_game('123456', {'scores': {}, 'client_ts': 'yesterday'})
 
 
 @pytest.mark.asyncio
 async def test_optimistic_concurrency(setup_and_teardown):
-    """Test optimistic concurrency control."""
+    """Test that updates based on the same version merge unless they touch the same field."""
     db = setup_and_teardown
-    try:
-        # Create initial game
-        test_pin = generate_pin()
-        game_data = {
-            'pin': test_pin,
-            'host_id': 'test_host',
-            'status': 'waiting',
-            'players': []
-        }
-        game = await db.create_game(game_data)
+    test_pin = generate_pin()
+    await db.create_game({**WAITING_GAME, 'pin': test_pin})
+    game = await db.update_game(test_pin, {'status': 'active'})
+    base_version = game['version']
+
+    # Disjoint fields from the same base version both apply
+    await db.update_game(test_pin, {'status': 'question', 'version': base_version})
+    result = await db.update_game(test_pin, {
+        'current_question': {'index': 0},
+        'version': base_version
+    })
+    assert result['status'] == 'question'
+    assert result['current_question'] == {'index': 0}
+    assert result['version'] == base_version + 2
+
+    # A field changed since the base version is a conflict
+    with pytest.raises(ValidationError):
+        await db.update_game(test_pin, {'status': 'completed', 'version': base_version})
 
-        # Simulate concurrent updates
-        with patch.object(db.container, 'replace_item') as mock_replace:
-            # Mock conflict response for first attempt
-            conflict_error = exceptions.CosmosAccessConditionFailedError(
-                message="Conflict detected"
-            )
-            success_response = {
-                'id': game['id'],
-                'type': 'game',
-                'status': 'active'
-            }
-            mock_replace.side_effect = [conflict_error, success_response]
-
-            # Try to update game
-            updates = {'status': 'active'}
-            result = await db.update_game(test_pin, updates)
-            assert result['status'] == 'active'
 
-    except Exception as e:
-        pytest.fail(f"Test failed: {str(e)}")
+@pytest.mark.asyncio
+async def test_game_lookup_cache(setup_and_teardown):
+    """Test that repeated PIN lookups are served from the lookup cache."""
+    db = setup_and_teardown
+    test_pin = generate_pin()
+    await db.create_game({**WAITING_GAME, 'pin': test_pin})
+    await db.get_game_by_pin(test_pin)
+
+    with patch.object(db.container, 'read_item') as mock_read:
+        cached_game = await db.get_game_by_pin(test_pin)
+        assert cached_game['pin'] == test_pin
+        mock_read.assert_not_called()
+
+    # Deleting the game drops it from the cache
+    await db.delete_game(test_pin)
+    assert await db.get_game_by_pin(test_pin) is None
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_lookup_cache_isolation(setup_and_teardown):
+    """Test that cached lookups are private copies held per instance."""
+    db = setup_and_teardown
+    test_pin = generate_pin()
+    await db.create_game({**WAITING_GAME, 'pin': test_pin})
+
+    # Mutating a returned game must not change what later readers see
+    game = await db.get_game_by_pin(test_pin)
+    game['status'] = 'completed'
+    cached = await db.get_game_by_pin(test_pin)
+    assert cached['status'] == 'waiting'
+    cached['status'] = 'completed'
+    assert (await db.get_game_by_pin(test_pin))['status'] == 'waiting'
+
+    # Another instance has its own cache
+    other = fake_db()
+    other.container = db.container
+    assert not other._lookup_cache
+    assert (await other.get_game_by_pin(test_pin))['pin'] == test_pin
 
 
 @pytest.mark.asyncio
 async def test_transactions(setup_and_teardown):
     """Test transaction support."""
     db = setup_and_teardown
-    try:
-        # Test successful transaction
-        host_data = {
-            'email': 'transaction@test.com',
-            'password_hash': 'dummy_hash' * 10,  # Make it long enough
-            'name': 'Transaction Test'
-        }
-        bank_data = {
-            'name': 'Initial Bank',
-            'questions': []
-        }
+    # Test successful transaction
+    host_data = {
+        'email': generate_email('transaction'),
+        'password_hash': PASSWORD_HASH,
+        'name': 'Transaction Test'
+    }
+    bank_data = {
+        'name': 'Initial Bank',
+        'questions': []
+    }
+
+    result = await db.create_host_with_bank(host_data, bank_data)
+    assert result is not None
+
+    # Verify both host and bank were created; the saga returns the host's id
+    host, banks = await asyncio.gather(
+        db.get_host_by_email(host_data['email']),
+        db.get_question_banks_by_host(result['id'])
+    )
+    assert host is not None
+    assert len(banks) == 1
+
+    # Test transaction rollback
+    invalid_host = {
+        'email': 'invalid_email',  # Invalid email to trigger validation error
+        'password_hash': 'short'   # Invalid hash to ensure failure
+    }
+    valid_bank = {
+        'name': 'Should Not Exist',
+        'questions': []
+    }
+
+    with pytest.raises(ValidationError):
+        await db.create_host_with_bank(invalid_host, valid_bank)
+
+    # Verify nothing was created
+    host = await db.get_host_by_email(invalid_host['email'])
+    assert host is None
+
+
+async def async_items(items):
+    """Yield items the way query_items() does."""
+    for item in items:
+        yield item
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_saga_compensation(setup_and_teardown):
+    """Test that a failed saga step undoes the steps that succeeded."""
+    db = setup_and_teardown
+    host_data = {'email': 'saga@test.com', 'password_hash': PASSWORD_HASH, 'name': 'Saga Test'}
+    bank_data = {'name': 'Initial Bank', 'questions': []}
+    bank_error = exceptions.CosmosHttpResponseError(message="Service Unavailable", status_code=503)
 
-        result = await db.create_host_with_bank(host_data, bank_data)
-        assert result is not None
+    with patch.object(db, 'create_question_bank', new=AsyncMock(side_effect=bank_error)):
+        with pytest.raises(TransactionError):
+            await db.create_host_with_bank(host_data, bank_data)
 
-        # Verify both host and bank were created
-        host = await db.get_host_by_email(host_data['email'])
-        assert host is not None
-        banks = await db.get_question_banks_by_host(host['id'])
-        assert len(banks) == 1
+    # The host that was written is gone, and so is the saga record
+    with pytest.raises(exceptions.CosmosResourceNotFoundError):
+        await db.container.read_item(item=host_data['id'], partition_key=HOST_PARTITION)
+    assert not [key for key in db.container._items if key[0] == SAGA_PARTITION]
 
-        # Test transaction rollback
-        invalid_host = {
-            'email': 'invalid_email',  # Invalid email to trigger validation error
-            'password_hash': 'short'   # Invalid hash to ensure failure
-        }
-        valid_bank = {
-            'name': 'Should Not Exist',
-            'questions': []
-        }
 
-        with pytest.raises(ValidationError):
-            await db.create_host_with_bank(invalid_host, valid_bank)
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_saga_reconciliation(setup_and_teardown):
+    """Test that reconcile_sagas() finishes rollbacks and drops records of completed sagas."""
+    db = setup_and_teardown
+    host_data = {'email': 'reconcile@test.com', 'password_hash': PASSWORD_HASH, 'name': 'Saga Test'}
+    bank_error = exceptions.CosmosHttpResponseError(message="Service Unavailable", status_code=503)
+    delete_error = exceptions.CosmosHttpResponseError(message="Service Unavailable", status_code=503)
 
-        # Verify nothing was created
-        host = await db.get_host_by_email(invalid_host['email'])
-        assert host is None
+    # A rollback that cannot delete the host leaves the saga pending
+    with patch.object(db, 'create_question_bank', new=AsyncMock(side_effect=bank_error)), \
+            patch.object(db.container, 'delete_item', new=AsyncMock(side_effect=delete_error)):
+        with pytest.raises(TransactionError):
+            await db.create_host_with_bank(host_data, {'name': 'Orphaned Bank'})
+    failed = db.container._items[next(key for key in db.container._items if key[0] == SAGA_PARTITION)]
 
-    except Exception as e:
-        pytest.fail(f"Test failed: {str(e)}")
+    # A saga whose writes all landed but whose record was never removed
+    complete_bank = await db.create_question_bank({'host_id': TEST_HOST_ID, 'name': 'Kept Bank'})
+    complete = await db._begin_saga([(complete_bank['id'], BANK_PARTITION)])
+
+    # FakeContainer has no query engine, so hand back the abandoned sagas directly
+    pending = async_items([failed, complete])
+    with patch.object(db.container, 'query_items', return_value=pending, create=True):
+        await db.reconcile_sagas()
+
+    with pytest.raises(exceptions.CosmosResourceNotFoundError):
+        await db.container.read_item(item=host_data['id'], partition_key=HOST_PARTITION)
+    assert await db.container.read_item(item=complete_bank['id'], partition_key=BANK_PARTITION)
+    assert not [key for key in db.container._items if key[0] == SAGA_PARTITION]
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_overlapping_sagas(setup_and_teardown):
+    """Test that sagas can run while another saga is still pending."""
+    db = setup_and_teardown
+    # A saga abandoned earlier and not yet reconciled
+    await db._begin_saga([(generate_id('host'), HOST_PARTITION)])
+
+    hosts = [
+        {'email': generate_email(f'overlap{i}'), 'password_hash': PASSWORD_HASH, 'name': 'Saga Test'}
+        for i in range(2)
+    ]
+    await asyncio.gather(*(
+        db.create_host_with_bank(host, {'name': 'Initial Bank', 'questions': []})
+        for host in hosts
+    ))
+
+    for host in hosts:
+        assert await db.container.read_item(item=host['id'], partition_key=HOST_PARTITION)
+    assert len([key for key in db.container._items if key[0] == BANK_PARTITION]) == 2
+    assert len([key for key in db.container._items if key[0] == SAGA_PARTITION]) == 1
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_concurrent_saga_sweepers(setup_and_teardown):
+    """Test that two sweepers racing on one pending saga settle it once."""
+    db = setup_and_teardown
+    host_data = {'email': generate_email('sweep'), 'password_hash': PASSWORD_HASH, 'name': 'Saga Test'}
+    bank_error = exceptions.CosmosHttpResponseError(message="Service Unavailable", status_code=503)
+    delete_error = exceptions.CosmosHttpResponseError(message="Service Unavailable", status_code=503)
+
+    with patch.object(db, 'create_question_bank', new=AsyncMock(side_effect=bank_error)), \
+            patch.object(db.container, 'delete_item', new=AsyncMock(side_effect=delete_error)):
+        with pytest.raises(TransactionError):
+            await db.create_host_with_bank(host_data, {'name': 'Orphaned Bank'})
+    saga = db.container._items[next(key for key in db.container._items if key[0] == SAGA_PARTITION)]
+
+    # Two service workers share the container and both see the saga as abandoned
+    other = fake_db()
+    other.container = db.container
+    compensated = []
+    compensate = CosmosDB._compensate_saga
+
+    async def counting_compensate(self, pending):
+        compensated.append(pending['id'])
+        await compensate(self, pending)
+
+    with patch.object(db.container, 'query_items', side_effect=lambda **kwargs: async_items([saga]), create=True), \
+            patch.object(CosmosDB, '_compensate_saga', counting_compensate):
+        await asyncio.gather(db.reconcile_sagas(), other.reconcile_sagas())
+
+    assert compensated == [saga['id']]
+    with pytest.raises(exceptions.CosmosResourceNotFoundError):
+        await db.container.read_item(item=host_data['id'], partition_key=HOST_PARTITION)
+    assert not [key for key in db.container._items if key[0] == SAGA_PARTITION]
+
+
+@pytest.mark.diagnostic
+@pytest.mark.asyncio
+async def test_cleanup_queries_use_index(setup_and_teardown):
+    """Test that every cleanup query is served from the index, not a scan."""
+    db = setup_and_teardown
+    parameters = stale_parameters()
+
+    for partition, query in CLEANUP_QUERIES.items():
+        items = db.container.query_items(
+            query=query,
+            parameters=parameters,
+            partition_key=partition,
+            populate_index_metrics=True
+        )
+        async for _ in items:
+            pass
+
+        encoded = db.container.client_connection.last_response_headers.get(
+            'x-ms-cosmos-index-utilization'
+        )
+        assert encoded, f"No index metrics returned for: {query}"
+        metrics = json.loads(base64.b64decode(encoded))
+        assert metrics['UtilizedSingleIndexes'], f"Unindexed query: {query}"
+        assert not metrics['PotentialSingleIndexes'], f"Missing index for: {query}"
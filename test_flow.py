@@ -1,120 +1,209 @@
 import pytest
-import requests
+import pytest_asyncio
+import httpx
+import respx
 import socketio
 import time
+import uuid
 import json
 import os
 import asyncio
 from contextlib import asynccontextmanager
-
-# Test configuration
-AUTH_SERVICE = os.getenv('AUTH_SERVICE_URL', 'http://localhost:5001')
-GAME_SERVICE = os.getenv('GAME_SERVICE_URL', 'http://localhost:5002')
+from filelock import FileLock
+
+try:
+    import uvloop
+except ImportError:  # uvloop is not available on Windows
+    uvloop = None
+
+# Test configuration; IPv4 loopback skips the AAAA-then-A lookup of 'localhost'
+AUTH_SERVICE = os.getenv('AUTH_SERVICE_URL', 'http://127.0.0.1:5001')
+GAME_SERVICE = os.getenv('GAME_SERVICE_URL', 'http://127.0.0.1:5002')
+SERVICE_READY_TIMEOUT = 10  # seconds
+# REST calls are stubbed unless FLOW_INTEGRATION=1; socket tests need live services
+INTEGRATION = os.getenv('FLOW_INTEGRATION') == '1'
+requires_services = pytest.mark.skipif(
+    not INTEGRATION, reason="needs live services; set FLOW_INTEGRATION=1"
+)
+STUB_HOST_ID = 'host_stub'
+STUB_PIN = '123456'
+
+def stub_services():
+    """Route the auth and game REST endpoints to canned in-process responses."""
+    router = respx.mock(assert_all_called=False)
+    for service in (AUTH_SERVICE, GAME_SERVICE):
+        router.get(f"{service}/health").respond(200, json={'status': 'healthy'})
+    router.post(f"{AUTH_SERVICE}/host/register").respond(
+        201, json={'message': 'Host registered successfully', 'host_id': STUB_HOST_ID}
+    )
+    router.post(f"{AUTH_SERVICE}/host/login").respond(
+        200, json={'token': 'stub-token', 'host_id': STUB_HOST_ID}
+    )
+    router.post(f"{AUTH_SERVICE}/host/verify").respond(
+        200, json={'valid': True, 'host_id': STUB_HOST_ID}
+    )
+    router.post(f"{GAME_SERVICE}/game/create").respond(
+        200, json={'pin': STUB_PIN, 'status': 'created'}
+    )
+    router.get(f"{GAME_SERVICE}/game/{STUB_PIN}/status").respond(
+        200, json={'status': 'lobby', 'player_count': 0, 'players': []}
+    )
+    router.get(f"{GAME_SERVICE}/game/000000/status").respond(
+        404, json={'error': 'Game not found'}
+    )
+    return router
 
 # Test fixtures
-@pytest.fixture(scope="module")
+@pytest.fixture(scope="session")
 def event_loop():
-    """Create an instance of the default event loop for the test module."""
-    loop = asyncio.get_event_loop_policy().new_event_loop()
+    """Share one loop with the session-scoped async fixtures (pytest-asyncio 0.21)."""
+    loop = uvloop.new_event_loop() if uvloop else asyncio.new_event_loop()
     yield loop
     loop.close()
 
-@pytest.fixture(scope="module")
-async def auth_token():
-    """Get authentication token for tests."""
-    register_data = {
-        "email": f"test_{int(time.time())}@example.com",
-        "password": "test123"
-    }
-
-    # Register new host
-    register_response = requests.post(
-        f"{AUTH_SERVICE}/host/register",
-        json=register_data
-    )
-    assert register_response.status_code == 201
-
-    # Login and get token
-    login_response = requests.post(
-        f"{AUTH_SERVICE}/host/login",
-        json=register_data
-    )
-    assert login_response.status_code == 200
-    return login_response.json()['token']
-
-@pytest.fixture(scope="module")
-async def game_pin(auth_token):
-    """Create a game and return its PIN."""
-    create_response = requests.post(
-        f"{GAME_SERVICE}/game/create",
-        headers={'Authorization': f'Bearer {auth_token}'}
+@pytest_asyncio.fixture(scope="session")
+async def http():
+    """Share one keep-alive HTTP client across the session's REST calls."""
+    async with httpx.AsyncClient(
+        timeout=5,
+        limits=httpx.Limits(max_keepalive_connections=10)
+    ) as client:
+        if INTEGRATION:
+            yield client
+        else:
+            with stub_services():
+                yield client
+
+async def wait_until_healthy(http, service, deadline):
+    """Poll a service's health check until it answers, backing off up to 1s."""
+    delay = 0.05
+    while True:
+        try:
+            response = await http.get(f"{service}/health", timeout=0.5)
+            if response.status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        if time.monotonic() >= deadline:
+            pytest.fail(f"{service} not ready after {SERVICE_READY_TIMEOUT}s")
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, 1.0)
+
+@pytest_asyncio.fixture(scope="session", autouse=True)
+async def services_ready(http):
+    """Wait for the auth and game services together before any test runs."""
+    deadline = time.monotonic() + SERVICE_READY_TIMEOUT
+    await asyncio.gather(
+        wait_until_healthy(http, AUTH_SERVICE, deadline),
+        wait_until_healthy(http, GAME_SERVICE, deadline)
     )
-    assert create_response.status_code == 200
-    return create_response.json()['pin']
 
-@pytest.fixture
+async def shared_across_workers(tmp_path_factory, name, create):
+    """Run create() once per test run and share its JSON result with every xdist worker."""
+    if 'PYTEST_XDIST_WORKER' not in os.environ:  # not running under xdist
+        return await create()
+
+    # Workers share the parent of their per-worker base temp directories
+    path = tmp_path_factory.getbasetemp().parent / f"{name}.json"
+    with FileLock(f"{path}.lock"):
+        if path.is_file():
+            return json.loads(path.read_text())
+        value = await create()
+        path.write_text(json.dumps(value))
+        return value
+
+@pytest_asyncio.fixture(scope="session")
+async def auth_token(http, tmp_path_factory):
+    """Register one host per test run and return its token."""
+    async def register():
+        register_data = {
+            "email": f"test_{uuid.uuid4().hex}@example.com",
+            "password": "test123"
+        }
+
+        # Register new host
+        register_response = await http.post(
+            f"{AUTH_SERVICE}/host/register",
+            json=register_data
+        )
+        assert register_response.status_code == 201
+
+        # Login and get token
+        login_response = await http.post(
+            f"{AUTH_SERVICE}/host/login",
+            json=register_data
+        )
+        assert login_response.status_code == 200
+        return login_response.json()['token']
+
+    return await shared_across_workers(tmp_path_factory, 'auth_token', register)
+
+@pytest_asyncio.fixture(scope="session")
+async def game_pin(http, auth_token, tmp_path_factory):
+    """Create one game per test run and return its PIN."""
+    async def create_game():
+        create_response = await http.post(
+            f"{GAME_SERVICE}/game/create",
+            headers={'Authorization': f'Bearer {auth_token}'}
+        )
+        assert create_response.status_code == 200
+        return create_response.json()['pin']
+
+    return await shared_across_workers(tmp_path_factory, 'game_pin', create_game)
+
+@pytest_asyncio.fixture(scope="session")
 async def socket_client():
-    """Create and yield a socket client, then cleanup."""
-    sio = socketio.AsyncClient()
+    """Connect one socket client for the session, over WebSocket only."""
+    sio = socketio.AsyncClient(reconnection=False)
+    # Skipping the long-polling upgrade saves a round trip on connect
+    await sio.connect(GAME_SERVICE, transports=['websocket'], wait_timeout=2)
     yield sio
     if sio.connected:
         await sio.disconnect()
 
-@pytest.mark.asyncio
-async def test_host_flow(auth_token):
+@pytest.fixture
+def socket_errors(socket_client):
+    """Collect 'error' events for one test, then restore the previous handler."""
+    errors = []
+    handlers = socket_client.handlers.setdefault('/', {})
+    previous = handlers.get('error')
+    socket_client.on('error', errors.append)
+    yield errors
+    if previous is None:
+        handlers.pop('error', None)
+    else:
+        handlers['error'] = previous
+
+async def test_host_flow(http, auth_token):
     """Test host authentication and game creation flow."""
     assert auth_token, "Authentication token should be valid"
 
     # Verify token is valid
-    verify_response = requests.post(
+    verify_response = await http.post(
         f"{AUTH_SERVICE}/host/verify",
         headers={'Authorization': f'Bearer {auth_token}'}
     )
     assert verify_response.status_code == 200
     assert verify_response.json()['valid'] is True
 
-@pytest.mark.asyncio
+@requires_services
 async def test_player_flow(game_pin, socket_client):
     """Test player connection and game interaction flow."""
     assert game_pin, "Game PIN should be valid"
 
-    # Set up event handlers
-    events_received = []
-
-    @socket_client.event
-    def connect():
-        events_received.append('connect')
-
-    @socket_client.event
-    def disconnect():
-        events_received.append('disconnect')
-
-    @socket_client.on('player_joined')
-    def on_player_joined(data):
-        events_received.append(('player_joined', data))
-
-    @socket_client.on('game_started')
-    def on_game_started(data):
-        events_received.append(('game_started', data))
+    assert socket_client.connected
 
-    # Connect to game service
-    await socket_client.connect(GAME_SERVICE)
-    assert 'connect' in events_received
-
-    # Join game
-    await socket_client.emit('join_game', {
+    # The server acknowledges the join, so no event polling is needed
+    ack = await socket_client.call('join_game', {
         'pin': game_pin,
         'name': 'Test Player'
-    })
-
-    # Wait for join confirmation
-    await asyncio.sleep(1)
-    assert any(event[0] == 'player_joined' for event in events_received if isinstance(event, tuple))
+    }, timeout=1.0)
+    assert ack['ok']
+    assert ack['player_id']
 
-@pytest.mark.asyncio
-async def test_game_status(game_pin):
+async def test_game_status(http, game_pin):
     """Test game status endpoint."""
-    status_response = requests.get(f"{GAME_SERVICE}/game/{game_pin}/status")
+    status_response = await http.get(f"{GAME_SERVICE}/game/{game_pin}/status")
     assert status_response.status_code == 200
 
     status_data = status_response.json()
@@ -122,21 +211,16 @@ async def test_game_status(game_pin):
     assert isinstance(status_data['player_count'], int)
     assert isinstance(status_data['players'], list)
 
-@pytest.mark.asyncio
-async def test_error_handling():
+@requires_services
+async def test_error_handling(http, socket_client, socket_errors):
     """Test error handling for invalid game operations."""
-    # Test joining non-existent game
-    sio = socketio.AsyncClient()
-    await sio.connect(GAME_SERVICE)
-
-    with pytest.raises(Exception):
-        await sio.emit('join_game', {
-            'pin': '000000',
-            'name': 'Test Player'
-        })
-
-    await sio.disconnect()
+    # Test joining non-existent game; the server reports it on the 'error' event
+    await socket_client.call('join_game', {
+        'pin': '000000',
+        'name': 'Test Player'
+    }, timeout=1.0)
+    assert socket_errors and socket_errors[-1]['error'] == 'Game not found'
 
     # Test invalid game status
-    response = requests.get(f"{GAME_SERVICE}/game/000000/status")
+    response = await http.get(f"{GAME_SERVICE}/game/000000/status")
     assert response.status_code == 404